@@ -7,15 +7,17 @@ import os
 from flask import Flask
 from config import get_config, Config
 from auth import init_users, get_current_user, is_admin
+from utils.json_provider import OrjsonProvider
 
 # Create Flask app
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 config_obj = get_config(os.getenv('FLASK_ENV', 'development'))
 app.config.from_object(config_obj)
 
 # Ensure directories exist
-os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(Config.RECEIPT_FOLDER, exist_ok=True)
+os.makedirs(Config.RECEIPT_CACHE_FOLDER, exist_ok=True)
 
 # Initialize authentication
 init_users()
@@ -35,6 +37,10 @@ GroupModel()
 SplitModel()
 NotificationModel()
 
+# Generate due recurring transactions now and hourly, off the request path
+from services.recurring_processor import start_recurring_scheduler
+start_recurring_scheduler()
+
 # Register blueprints
 from routes import (
     main_bp, api_bp, transactions_bp, budgets_bp,
@@ -68,4 +74,6 @@ def internal_error(error):
     return "Internal server error", 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Development server only (debug follows FLASK_DEBUG); deploy with
+    # gunicorn, which reads gunicorn.conf.py
+    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
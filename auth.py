@@ -11,7 +11,7 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import session, redirect, url_for, flash
+from flask import session, redirect, url_for, flash, g, has_app_context
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,6 +21,16 @@ RESET_CODES_FILE = 'csv/reset_codes.csv'
 USER_HEADERS = ['id', 'username', 'password_hash', 'full_name', 'email', 'is_admin', 'active', 'must_change_password']
 RESET_HEADERS = ['code', 'username', 'expires', 'used']
 
+# ((mtime_ns, size), users, {column: {value: position}}) for the last parse of USERS_FILE
+_users_cache = None
+# Lookup keys indexed on each parse; emails match case-insensitively
+_USER_KEYS = {
+    'id': lambda user: user['id'],
+    'username': lambda user: user['username'],
+    'full_name': lambda user: user['full_name'],
+    'email': lambda user: (user.get('email') or '').lower(),
+}
+
 # Email configuration
 SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
 SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
@@ -66,27 +76,72 @@ def hash_password(password):
     """Hash password using SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def read_users():
-    """Read all users from CSV"""
-    users = []
+def _load_users():
+    """Parsed users plus an id -> position index, reparsed only when the file changes"""
+    users, indexes = _load_indexed_users()
+    return users, indexes['id']
+
+def _load_indexed_users():
+    """Parsed users plus a value -> position index per _USER_KEYS column"""
+    global _users_cache
     try:
-        with open(USERS_FILE, 'r', newline='') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                users.append(row)
+        version = users_version()
     except FileNotFoundError:
         init_users()
-        return read_users()
-    return users
+        return _load_indexed_users()
+    
+    if _users_cache is None or _users_cache[0] != version:
+        with open(USERS_FILE, 'r', newline='') as f:
+            users = list(csv.DictReader(f))
+        # First match wins, as with the linear scans these replace
+        indexes = {column: {} for column in _USER_KEYS}
+        for position, user in enumerate(users):
+            for column, key in _USER_KEYS.items():
+                indexes[column].setdefault(key(user), position)
+        _users_cache = (version, users, indexes)
+    return _users_cache[1], _users_cache[2]
+
+def _find_user(column, value):
+    """Copy of the first user whose column matches value, or None"""
+    users, indexes = _load_indexed_users()
+    position = indexes[column].get(value)
+    return dict(users[position]) if position is not None else None
+
+def users_version():
+    """Cheap stamp of the users file; changes whenever it is written"""
+    stat = os.stat(USERS_FILE)
+    return (stat.st_mtime_ns, stat.st_size)
+
+# Columns never sent back to the browser
+_PRIVATE_FIELDS = frozenset({'password_hash'})
+
+def read_users():
+    """Read all users from CSV"""
+    users, _ = _load_users()
+    return [dict(user) for user in users]
+
+def read_public_users():
+    """Read all users without their password hashes"""
+    users, _ = _load_users()
+    return [{k: v for k, v in user.items() if k not in _PRIVATE_FIELDS} for user in users]
+
+def _forget_current_user():
+    """Drop cached users after the users file changes"""
+    global _users_cache
+    _users_cache = None
+    if has_app_context():
+        g.pop('_current_user', None)
 
 def write_user(user):
     """Write a single user to CSV"""
+    _forget_current_user()
     with open(USERS_FILE, 'a', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=USER_HEADERS)
         writer.writerow(user)
 
 def rewrite_users(users):
     """Rewrite entire users file"""
+    _forget_current_user()
     with open(USERS_FILE, 'w', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=USER_HEADERS)
         writer.writeheader()
@@ -95,35 +150,31 @@ def rewrite_users(users):
 
 def get_user_by_username(username):
     """Get user by username"""
-    users = read_users()
-    for user in users:
-        if user['username'] == username:
-            return user
-    return None
+    return _find_user('username', username)
 
 def get_user_by_full_name(username):
     """Get user by full name"""
-    users = read_users()
-    for user in users:
-        if user['full_name'] == username:
-            return user
-    return None
+    return _find_user('full_name', username)
 
 def get_user_by_email(email):
     """Get user by email"""
-    users = read_users()
-    for user in users:
-        if user.get('email', '').lower() == email.lower():
-            return user
-    return None
+    return _find_user('email', email.lower())
 
 def get_user_by_id(user_id):
     """Get user by ID"""
-    users = read_users()
-    for user in users:
-        if user['id'] == str(user_id):
-            return user
-    return None
+    return _find_user('id', str(user_id))
+
+def get_user_names():
+    """id -> full name of every user, for labelling many rows at once"""
+    users, _ = _load_users()
+    return {user['id']: user['full_name'] for user in users}
+
+def _users_for_update(user_id):
+    """Copies of all users for rewriting, plus the target user's copy (or None)"""
+    cached, index = _load_users()
+    users = [dict(user) for user in cached]
+    position = index.get(str(user_id))
+    return users, users[position] if position is not None else None
 
 def verify_password(username, password):
     """Verify username and password"""
@@ -141,11 +192,10 @@ def must_change_password(user_id):
 
 def change_password(user_id, new_password):
     """Change user password and clear must_change flag"""
-    users = read_users()
-    for user in users:
-        if user['id'] == str(user_id):
-            user['password_hash'] = hash_password(new_password)
-            user['must_change_password'] = 'false'
+    users, user = _users_for_update(user_id)
+    if user:
+        user['password_hash'] = hash_password(new_password)
+        user['must_change_password'] = 'false'
     rewrite_users(users)
 
 def create_user(username, password, full_name, email, is_admin=False):
@@ -173,30 +223,28 @@ def create_user(username, password, full_name, email, is_admin=False):
 
 def update_user(user_id, data):
     """Update user data"""
-    users = read_users()
-    for user in users:
-        if user['id'] == str(user_id):
-            if 'username' in data:
-                user['username'] = data['username']
-            if 'full_name' in data:
-                user['full_name'] = data['full_name']
-            if 'email' in data:
-                user['email'] = data['email']
-            if 'password' in data and data['password']:
-                user['password_hash'] = hash_password(data['password'])
-                user['must_change_password'] = 'false'
-            if 'is_admin' in data:
-                user['is_admin'] = 'true' if data['is_admin'] else 'false'
-            if 'active' in data:
-                user['active'] = 'true' if data['active'] else 'false'
+    users, user = _users_for_update(user_id)
+    if user:
+        if 'username' in data:
+            user['username'] = data['username']
+        if 'full_name' in data:
+            user['full_name'] = data['full_name']
+        if 'email' in data:
+            user['email'] = data['email']
+        if 'password' in data and data['password']:
+            user['password_hash'] = hash_password(data['password'])
+            user['must_change_password'] = 'false'
+        if 'is_admin' in data:
+            user['is_admin'] = 'true' if data['is_admin'] else 'false'
+        if 'active' in data:
+            user['active'] = 'true' if data['active'] else 'false'
     rewrite_users(users)
 
 def delete_user(user_id):
     """Delete a user (set inactive)"""
-    users = read_users()
-    for user in users:
-        if user['id'] == str(user_id):
-            user['active'] = 'false'
+    users, user = _users_for_update(user_id)
+    if user:
+        user['active'] = 'false'
     rewrite_users(users)
 
 # Password Reset Functions
@@ -379,10 +427,14 @@ def admin_required(f):
     return decorated_function
 
 def get_current_user():
-    """Get currently logged in user"""
+    """Get currently logged in user (looked up once per request)"""
     if 'user_id' not in session:
         return None
-    return get_user_by_id(session['user_id'])
+    cached = g.get('_current_user')
+    if cached is None or cached[0] != session['user_id']:
+        cached = (session['user_id'], get_user_by_id(session['user_id']))
+        g._current_user = cached
+    return dict(cached[1]) if cached[1] else None
 
 def is_admin():
     """Check if current user is admin"""
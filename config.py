@@ -14,13 +14,17 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'change-this-in-production')
     
     # File Upload
-    UPLOAD_FOLDER = 'uploads'
     RECEIPT_FOLDER = 'receipts'
+    # Scan results by receipt file, so a re-uploaded receipt skips Azure
+    RECEIPT_CACHE_FOLDER = 'receipt_cache'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf'}
+    ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'pdf'})
     
     # Database
     USE_CSV = os.getenv('USE_CSV', 'true').lower() == 'true'
+    # Keep the tables in SQLite instead, imported from the CSVs on first use
+    USE_SQLITE = os.getenv('USE_SQLITE', 'false').lower() == 'true'
+    SQLITE_PATH = os.getenv('SQLITE_PATH', 'csv/data.db')
     DB_HOST = os.getenv('DB_HOST', 'localhost')
     DB_PORT = os.getenv('DB_PORT', '5432')
     DB_NAME = os.getenv('DB_NAME', 'receipt_tracker')
@@ -44,7 +48,8 @@ class Config:
     BUDGET_CRITICAL_THRESHOLD = float(os.getenv('BUDGET_CRITICAL_THRESHOLD', 0.90))  # 90%
     
     # Recurring Transaction Processing
-    RECURRING_CHECK_HOUR = int(os.getenv('RECURRING_CHECK_HOUR', '6'))  # 6 AM
+    RECURRING_CHECK_HOUR = int(os.getenv('RECURRING_CHECK_HOUR', '6'))  # 6 AM; daily alert run
+    RECURRING_INTERVAL_MINUTES = float(os.getenv('RECURRING_INTERVAL_MINUTES', '60'))  # 0 = startup only
     
     # Categories
     EXPENSE_CATEGORIES = [
@@ -68,6 +73,18 @@ class Config:
         'notifications': 'csv/notifications.csv'
     }
     
+    # Store the CSV tables gzip-compressed (csv/*.csv.gz)
+    COMPRESS_CSV = os.getenv('COMPRESS_CSV', 'false').lower() == 'true'
+    if COMPRESS_CSV:
+        CSV_FILES = {table: path + '.gz' for table, path in CSV_FILES.items()}
+    
+    # Buffer appended rows in memory and write them out in batches
+    BUFFER_CSV_WRITES = os.getenv('BUFFER_CSV_WRITES', 'false').lower() == 'true'
+    CSV_WRITE_BATCH_SIZE = int(os.getenv('CSV_WRITE_BATCH_SIZE', '1000'))
+    CSV_WRITE_FLUSH_SECONDS = float(os.getenv('CSV_WRITE_FLUSH_SECONDS', '1'))
+    # Append single-row updates and deletes to a journal instead of rewriting the file
+    JOURNAL_CSV_WRITES = os.getenv('JOURNAL_CSV_WRITES', 'false').lower() == 'true'
+    
     CSV_HEADERS = {
         'transactions': ['id', 'item_name', 'category', 'store', 'date', 'price', 
                         'user_id', 'bank_account_id', 'type', 'receipt_image', 
@@ -0,0 +1,26 @@
+"""
+Gunicorn settings for Receipt Tracker
+Loaded automatically when gunicorn is started from this directory
+"""
+
+import os
+import multiprocessing
+from config import Config
+
+wsgi_app = 'app:app'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Dashboard aggregation is CPU-bound Python, so separate processes are what
+# let requests run in parallel; threads cover the I/O-bound routes
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2))
+
+# Buffered and journaled CSV writes keep pending rows in process memory,
+# which other workers would never see, so those modes run one process
+if Config.BUFFER_CSV_WRITES or Config.JOURNAL_CSV_WRITES:
+    workers = 1
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Each worker imports the app itself: preloading would fork workers from a
+# master whose recurring-scheduler thread may be holding a table lock
+preload_app = False
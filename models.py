@@ -3,101 +3,693 @@ Data models and CSV operations for Receipt Tracker
 Handles all data persistence operations
 """
 
+import io
 import os
 import csv
-from typing import List, Dict, Optional
+import gzip
+import time
+import atexit
+import shutil
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+import numpy as np
+from typing import List, Dict, Iterator, Optional
 from config import Config
 
 class CSVModel:
     """Base class for CSV operations"""
     
+    # filename -> (version, rows); parsed tables shared across instances
+    _cache = {}
+    # filename -> (rows, {id: position}); rebuilt when the cached rows change
+    _indexes = {}
+    # filename -> rows appended but not yet written (BUFFER_CSV_WRITES)
+    _pending = defaultdict(list)
+    _last_flush = {}
+    _write_lock = threading.Lock()
+    # filename -> (StringIO, DictWriter) reused to format rows before appending
+    _formatters = {}
+    # filename -> [file version, next id]; carried across this process's own writes
+    _next_ids = {}
+    # filename -> full table awaiting a debounced rewrite (BUFFER_CSV_WRITES),
+    # with a per-table count of such rewrites so version() still changes
+    _dirty = {}
+    _generations = defaultdict(int)
+    _timers = {}
+    # filename -> timer that flushes appended rows nobody else flushes first
+    _flush_timers = {}
+    # Tables whose journal (JOURNAL_CSV_WRITES) was checked for leftovers
+    _compacted = set()
+    # Columns whose repeated values share one str object per parsed table
+    _SHARED_COLUMNS = ()
+    
     def __init__(self, table_name: str):
         self.table_name = table_name
         self.filename = Config.CSV_FILES[table_name]
         self.headers = Config.CSV_HEADERS[table_name]
+        # Updates and deletes appended since the file was last rewritten
+        self.journal = self.filename + '.journal'
         self._ensure_file_exists()
     
     def _ensure_file_exists(self):
         """Ensure CSV file exists with headers"""
-        if not os.path.exists(self.filename):
-            with open(self.filename, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.headers)
-                writer.writeheader()
+        if self.filename not in self._compacted:
+            # First use in this process: fold in a journal left by an earlier run
+            self._compacted.add(self.filename)
+            if os.path.exists(self.journal):
+                self.compact()
+        if os.path.exists(self.filename):
+            return
+        
+        plain = self.filename[:-len('.gz')]
+        if self.filename.endswith('.gz') and os.path.exists(plain):
+            # Compression was just switched on; carry the existing table over
+            with open(plain, 'rb') as src, gzip.open(self.filename, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            return
+        
+        with self._open('w') as f:
+            writer = csv.DictWriter(f, fieldnames=self.headers)
+            writer.writeheader()
     
-    def read_all(self) -> List[Dict]:
-        """Read all rows from CSV"""
-        items = []
+    def _open(self, mode: str):
+        """Open the CSV file, handling gzip-compressed tables transparently"""
+        if self.filename.endswith('.gz'):
+            return gzip.open(self.filename, mode + 't', newline='')
+        # 1 MiB reads instead of the 8 KiB default when parsing large tables
+        return open(self.filename, mode, buffering=1 << 20, newline='')
+    
+    def version(self) -> tuple:
+        """Cheap stamp of the file's state; changes whenever the table is written"""
+        self.flush()
+        return (self._file_version(), self._generations[self.filename])
+    
+    def _file_version(self) -> tuple:
+        stat = os.stat(self.filename)
+        if Config.JOURNAL_CSV_WRITES:
+            try:
+                journal = os.stat(self.journal)
+                return (stat.st_mtime_ns, stat.st_size, journal.st_mtime_ns, journal.st_size)
+            except FileNotFoundError:
+                pass
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def _rows(self, flush: bool = True) -> List[Dict]:
+        """Parsed rows, reparsed only when the file's version changes
+        
+        The list and its dicts are shared with every other caller, so this
+        is for read-only use; read_all() hands out copies.
+        """
+        if flush:
+            self.flush()
+        dirty = self._dirty.get(self.filename)
+        if dirty is not None:
+            return dirty
         try:
-            with open(self.filename, 'r', newline='') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    items.append(row)
+            version = self._file_version()
         except FileNotFoundError:
             self._ensure_file_exists()
-        return items
+            return []
+        
+        cached = self._cache.get(self.filename)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        rows = self._load()
+        self._share_values(rows)
+        self._cache[self.filename] = (version, rows)
+        return rows
+    
+    def _share_values(self, rows: List[Dict]):
+        """Point equal values of _SHARED_COLUMNS at one string
+        
+        Categories, ids and dates repeat on most rows; sharing them cuts the
+        cached table's memory and lets == short-circuit on identity. A
+        per-load dict is used rather than sys.intern, whose strings are
+        never freed.
+        """
+        columns = [c for c in self._SHARED_COLUMNS if rows and c in rows[0]]
+        if not columns:
+            return
+        canonical = {}
+        shared = canonical.setdefault
+        for row in rows:
+            for column in columns:
+                value = row[column]
+                row[column] = shared(value, value)
+    
+    def _load(self) -> List[Dict]:
+        """Parse every row from storage, with any journaled changes applied"""
+        rows = self._parse()
+        if os.path.exists(self.journal):
+            self._replay(rows)
+        return rows
+    
+    def _parse(self) -> List[Dict]:
+        """Parse every row of the CSV file"""
+        # Zipping positional rows onto the header skips DictReader's
+        # per-row bookkeeping, which is most of its cost on large tables
+        with self._open('r') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            rows = [dict(zip(header, values)) for values in reader]
+        if any(len(row) != len(header) for row in rows):
+            # Blank or ragged lines: let DictReader skip and pad them as before
+            with self._open('r') as f:
+                return list(csv.DictReader(f))
+        return rows
+    
+    def _replay(self, rows: List[Dict]):
+        """Apply the journal's updates and deletes to rows, in order, in place"""
+        positions = defaultdict(list)
+        for position, row in enumerate(rows):
+            positions[row['id']].append(position)
+        with open(self.journal, newline='') as f:
+            for entry in csv.DictReader(f):
+                op = entry.pop('op')
+                matches = positions.get(entry['id'])
+                if not matches:
+                    continue
+                if op == 'del':
+                    rows[matches.pop(0)] = None
+                else:
+                    rows[matches[0]] = entry
+        rows[:] = [row for row in rows if row is not None]
+    
+    def read_all(self) -> List[Dict]:
+        """Read all rows from CSV"""
+        return [dict(row) for row in self._rows()]
+    
+    def iter_rows(self) -> Iterator[Dict]:
+        """Iterate the shared rows without copying them
+        
+        For lookups that only filter: copy just the rows you return, e.g.
+        ``[dict(r) for r in self.iter_rows() if ...]``.
+        """
+        return iter(self._rows())
+    
+    def _where(self, column: str, value) -> List[Dict]:
+        """Copies of the rows whose column equals value"""
+        return [dict(row) for row in self.iter_rows() if row.get(column) == value]
     
     def write_row(self, row: Dict):
         """Append a single row to CSV"""
-        with open(self.filename, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=self.headers)
-            writer.writerow(row)
+        self.write_rows([row])
+    
+    def write_rows(self, rows: List[Dict]):
+        """Append several rows to CSV with one write"""
+        if not rows:
+            return
+        if not Config.BUFFER_CSV_WRITES:
+            with self._write_lock:
+                self._append(rows)
+            return
+        
+        with self._write_lock:
+            pending = self._pending[self.filename]
+            pending.extend(rows)
+            last = self._last_flush.setdefault(self.filename, time.monotonic())
+            due = len(pending) >= Config.CSV_WRITE_BATCH_SIZE or \
+                  time.monotonic() - last >= Config.CSV_WRITE_FLUSH_SECONDS
+            if not due and self.filename not in self._flush_timers:
+                # Make sure a quiet table still gets its rows written soon
+                timer = threading.Timer(Config.CSV_WRITE_FLUSH_SECONDS, self._timed_flush)
+                timer.daemon = True
+                self._flush_timers[self.filename] = timer
+                timer.start()
+        if due:
+            self.flush()
+    
+    def _timed_flush(self):
+        with self._write_lock:
+            self._flush_timers.pop(self.filename, None)
+        self.flush()
+    
+    def flush(self):
+        """Write out any rows buffered by write_row"""
+        if not self._pending.get(self.filename):
+            return
+        with self._write_lock:
+            rows = self._pending.pop(self.filename, None)
+            if not rows:
+                return
+            dirty = self._dirty.get(self.filename)
+            if dirty is not None:
+                # A rewrite is already queued; fold the rows into it
+                self._dirty[self.filename] = dirty + rows
+                self._generations[self.filename] += 1
+            else:
+                self._append(rows)
+            self._last_flush[self.filename] = time.monotonic()
+    
+    def _append(self, rows: List[Dict]):
+        """Append rows in a single write, formatted by a reused writer (caller holds _write_lock)"""
+        formatter = self._formatters.get(self.filename)
+        if formatter is None:
+            buffer = io.StringIO()
+            formatter = (buffer, csv.DictWriter(buffer, fieldnames=self.headers))
+            self._formatters[self.filename] = formatter
+        buffer, writer = formatter
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        before = self._file_version()
+        self._cache.pop(self.filename, None)
+        with self._open('a') as f:
+            f.write(buffer.getvalue())
+        self._carry_next_id(before, rows)
     
     def rewrite_all(self, rows: List[Dict]):
         """Rewrite entire CSV file"""
-        with open(self.filename, 'w', newline='') as f:
+        self.flush()
+        with self._write_lock:
+            if not Config.BUFFER_CSV_WRITES:
+                self._rewrite(rows)
+                return
+            # Serve the new rows from memory and write them once the burst
+            # of updates settles, instead of rewriting the file per update
+            self._dirty[self.filename] = rows
+            self._generations[self.filename] += 1
+            if self.filename not in self._timers:
+                timer = threading.Timer(Config.CSV_WRITE_FLUSH_SECONDS, self.write_back)
+                timer.daemon = True
+                self._timers[self.filename] = timer
+                timer.start()
+    
+    def write_back(self):
+        """Write out a rewrite queued by rewrite_all (BUFFER_CSV_WRITES)"""
+        with self._write_lock:
+            self._timers.pop(self.filename, None)
+            rows = self._dirty.get(self.filename)
+            if rows is None:
+                return
+            self._rewrite(rows)
+            # The file now matches the rows already in memory; keep them cached
+            self._cache[self.filename] = (self._file_version(), rows)
+            del self._dirty[self.filename]
+    
+    def _rewrite(self, rows: List[Dict]):
+        """Replace the file's contents with rows (caller holds _write_lock)"""
+        before = self._file_version()
+        self._cache.pop(self.filename, None)
+        with self._open('w') as f:
             writer = csv.DictWriter(f, fieldnames=self.headers)
             writer.writeheader()
-            for row in rows:
-                writer.writerow(row)
+            writer.writerows(rows)
+        # rows already include every journaled change; removed only after
+        # the rewrite, so a crash in between just replays it again
+        try:
+            os.remove(self.journal)
+        except FileNotFoundError:
+            pass
+        self._carry_next_id(before, rows)
+    
+    def _log_change(self, op: str, row: Dict, rows: List[Dict]) -> bool:
+        """Append a one-row update or delete to the journal (JOURNAL_CSV_WRITES)
+        
+        rows is the table with the change applied; it becomes the cached
+        table, and is written out once the journal outgrows a quarter of
+        the file. Returns False if the change must go through rewrite_all.
+        """
+        if not Config.JOURNAL_CSV_WRITES:
+            return False
+        with self._write_lock:
+            if self.filename in self._dirty:
+                # A rewrite is already queued (BUFFER_CSV_WRITES); let it carry this
+                return False
+            before = self._file_version()
+            cached = self._cache.get(self.filename)
+            new = not os.path.exists(self.journal)
+            with open(self.journal, 'a', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=('op', *self.headers))
+                if new:
+                    writer.writeheader()
+                writer.writerow({'op': op, **row})
+            if os.path.getsize(self.journal) > os.path.getsize(self.filename) / 4:
+                self._rewrite(rows)
+            else:
+                self._carry_next_id(before, [])
+            if cached is not None and cached[0] == before:
+                # rows were derived from the cached table; keep serving them
+                self._cache[self.filename] = (self._file_version(), rows)
+            else:
+                self._cache.pop(self.filename, None)
+        return True
+    
+    def compact(self):
+        """Fold the journal into the CSV file (JOURNAL_CSV_WRITES)"""
+        self.flush()
+        with self._write_lock:
+            if self.filename in self._dirty or not os.path.exists(self.journal):
+                return
+            self._rewrite(self._load())
+    
+    def _carry_next_id(self, before: tuple, rows: List[Dict]):
+        """Keep the id counter valid across our own write (caller holds _write_lock)"""
+        counter = self._next_ids.get(self.filename)
+        if counter is None or counter[0] != before:
+            return
+        for row in rows:
+            if int(row['id']) >= counter[1]:
+                counter[1] = int(row['id']) + 1
+        counter[0] = self._file_version()
     
     def get_next_id(self) -> int:
         """Get next available ID"""
-        items = self.read_all()
-        if not items:
-            return 1
-        return max(int(t['id']) for t in items) + 1
+        with self._write_lock:
+            version = self._file_version()
+            counter = self._next_ids.get(self.filename)
+            if counter is None or counter[0] != version:
+                # First use, or another process wrote the file: rescan once.
+                # Buffered rows count too, without forcing them out
+                items = self._rows(flush=False) + self._pending.get(self.filename, [])
+                next_id = max((int(t['id']) for t in items), default=0) + 1
+                if counter is not None:
+                    next_id = max(next_id, counter[1])
+                counter = self._next_ids[self.filename] = [version, next_id]
+            counter[1] += 1
+            return counter[1] - 1
+    
+    def _position(self, item_id) -> Optional[int]:
+        """Row position of an id in the current table, via a cached index"""
+        rows = self._rows()
+        cached = self._indexes.get(self.filename)
+        if cached is None or cached[0] is not rows:
+            index = {}
+            for position, row in enumerate(rows):
+                index.setdefault(row['id'], position)
+            cached = (rows, index)
+            self._indexes[self.filename] = cached
+        return cached[1].get(str(item_id))
     
     def find_by_id(self, item_id: int) -> Optional[Dict]:
         """Find item by ID"""
-        items = self.read_all()
-        for item in items:
-            if item['id'] == item_id:
-                return item
-        return None
+        position = self._position(item_id)
+        if position is None:
+            return None
+        return dict(self._rows()[position])
     
     def delete_by_id(self, item_id: int) -> bool:
         """Delete item by ID"""
-        items = self.read_all()
-        filtered = [item for item in items if int(item['id']) != item_id]
-        if len(filtered) < len(items):
-            self.rewrite_all(filtered)
-            return True
-        return False
+        position = self._position(item_id)
+        if position is None:
+            return False
+        # Shallow copy: untouched rows are shared, never mutated
+        items = list(self._rows())
+        deleted = items.pop(position)
+        if not self._log_change('del', {'id': deleted['id']}, items):
+            self.rewrite_all(items)
+        return True
     
     def update_by_id(self, item_id: int, updates: Dict) -> bool:
         """Update item by ID"""
-        items = self.read_all()
-        found = False
-        for item in items:
-            print(item)
-            if int(item['id']) == item_id:
-                item.update(updates)
-                found = True
-                break
+        position = self._position(item_id)
+        if position is None:
+            return False
+        # Only the updated row is copied; the rest are shared, never mutated
+        items = list(self._rows())
+        items[position] = {**items[position], **updates}
+        if not self._log_change('upd', items[position], items):
+            self.rewrite_all(items)
+        return True
+    
+    def update_many(self, updates: Dict[str, Dict]) -> int:
+        """Update several items, {id: updates}, with a single rewrite
+        
+        Returns how many of the ids were found.
+        """
+        items = list(self._rows())
+        found = 0
+        for item_id, changes in updates.items():
+            position = self._position(item_id)
+            if position is not None:
+                items[position] = {**items[position], **changes}
+                found += 1
         if found:
             self.rewrite_all(items)
         return found
 
 
-class TransactionModel(CSVModel):
+_sqlite_local = threading.local()
+
+def get_sqlite_connection() -> sqlite3.Connection:
+    """This thread's connection to the SQLite database (USE_SQLITE)"""
+    conn = getattr(_sqlite_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(Config.SQLITE_PATH, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _sqlite_local.conn = conn
+    return conn
+
+
+class SQLiteModel(CSVModel):
+    """Same interface as CSVModel, backed by an indexed SQLite table
+    
+    Every column is TEXT so rows look exactly like the CSV ones. A table is
+    created and filled from its CSV file the first time it is opened.
+    """
+    
+    # Columns that get a B-tree index when the table has them
+    INDEXED_COLUMNS = ('id', 'user_id', 'group_id', 'receipt_group_id')
+    
+    _initialized = set()
+    
+    def _ensure_file_exists(self):
+        """Create the table, its indexes and version counter, importing the CSV"""
+        if self.table_name in self._initialized:
+            return
+        
+        conn = get_sqlite_connection()
+        columns = ', '.join(f'"{h}" TEXT NOT NULL DEFAULT \'\'' for h in self.headers)
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS table_versions '
+                         '(name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.table_name}" ({columns})')
+            for column in self.INDEXED_COLUMNS:
+                if column in self.headers:
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{self.table_name}_{column}" '
+                                 f'ON "{self.table_name}" ("{column}")')
+            created = conn.execute('INSERT OR IGNORE INTO table_versions VALUES (?, 0)',
+                                   (self.table_name,)).rowcount
+            if created and os.path.exists(self.filename):
+                self._insert(conn, CSVModel._load(self))
+        self._initialized.add(self.table_name)
+    
+    def _file_version(self) -> int:
+        row = get_sqlite_connection().execute(
+            'SELECT version FROM table_versions WHERE name = ?', (self.table_name,)
+        ).fetchone()
+        return row[0]
+    
+    def _bump(self, conn: sqlite3.Connection):
+        """Advance the table's version inside the current write transaction"""
+        self._cache.pop(self.filename, None)
+        conn.execute('UPDATE table_versions SET version = version + 1 WHERE name = ?',
+                     (self.table_name,))
+    
+    def _values(self, row: Dict) -> tuple:
+        """Row as a tuple in header order, stringified the way csv would"""
+        extra = row.keys() - set(self.headers)
+        if extra:
+            raise ValueError(f"dict contains fields not in fieldnames: {sorted(extra)}")
+        return tuple('' if row.get(h) is None else str(row[h]) for h in self.headers)
+    
+    def _insert(self, conn: sqlite3.Connection, rows: List[Dict]):
+        placeholders = ', '.join('?' * len(self.headers))
+        conn.executemany(f'INSERT INTO "{self.table_name}" VALUES ({placeholders})',
+                         [self._values(row) for row in rows])
+    
+    def _select(self, where: str = '', params: tuple = (), limit: int = -1) -> List[Dict]:
+        cursor = get_sqlite_connection().execute(
+            f'SELECT * FROM "{self.table_name}" {where} ORDER BY rowid LIMIT ?', (*params, limit)
+        )
+        return [dict(zip(self.headers, row)) for row in cursor]
+    
+    def _load(self) -> List[Dict]:
+        return self._select()
+    
+    def _where(self, column: str, value) -> List[Dict]:
+        if column not in self.INDEXED_COLUMNS:
+            return super()._where(column, value)
+        return self._select(f'WHERE "{column}" = ?', (value,))
+    
+    def write_rows(self, rows: List[Dict]):
+        """Insert several rows in one transaction"""
+        if not rows:
+            return
+        conn = get_sqlite_connection()
+        with conn:
+            self._insert(conn, rows)
+            self._bump(conn)
+    
+    def flush(self):
+        """Nothing is buffered; inserts commit immediately"""
+    
+    def rewrite_all(self, rows: List[Dict]):
+        """Replace every row in the table"""
+        conn = get_sqlite_connection()
+        with conn:
+            conn.execute(f'DELETE FROM "{self.table_name}"')
+            self._insert(conn, rows)
+            self._bump(conn)
+    
+    def get_next_id(self) -> int:
+        """Get next available ID
+        
+        Like CSVModel's, the counter runs ahead of the table, so rows built
+        for one create_many get distinct ids before any of them is inserted.
+        """
+        with self._write_lock:
+            version = self._file_version()
+            counter = self._next_ids.get(self.filename)
+            if counter is None or counter[0] != version:
+                row = get_sqlite_connection().execute(
+                    f'SELECT MAX(CAST(id AS INTEGER)) FROM "{self.table_name}"'
+                ).fetchone()
+                next_id = (row[0] or 0) + 1
+                if counter is not None:
+                    next_id = max(next_id, counter[1])
+                counter = self._next_ids[self.filename] = [version, next_id]
+            counter[1] += 1
+            return counter[1] - 1
+    
+    def find_by_id(self, item_id: int) -> Optional[Dict]:
+        """Find item by ID"""
+        rows = self._select('WHERE id = ?', (str(item_id),), limit=1)
+        return rows[0] if rows else None
+    
+    def delete_by_id(self, item_id: int) -> bool:
+        """Delete item by ID"""
+        conn = get_sqlite_connection()
+        with conn:
+            deleted = conn.execute(f'DELETE FROM "{self.table_name}" WHERE id = ?',
+                                   (str(item_id),)).rowcount
+            if deleted:
+                self._bump(conn)
+        return deleted > 0
+    
+    def update_by_id(self, item_id: int, updates: Dict) -> bool:
+        """Update item by ID"""
+        values = dict(zip(self.headers, self._values(updates)))
+        values = {h: values[h] for h in updates}
+        if not values:
+            return self.find_by_id(item_id) is not None
+        assignments = ', '.join(f'"{h}" = ?' for h in values)
+        conn = get_sqlite_connection()
+        with conn:
+            updated = conn.execute(
+                f'UPDATE "{self.table_name}" SET {assignments} '
+                f'WHERE rowid = (SELECT rowid FROM "{self.table_name}" WHERE id = ? ORDER BY rowid LIMIT 1)',
+                (*values.values(), str(item_id))
+            ).rowcount
+            if updated:
+                self._bump(conn)
+        return updated > 0
+    
+    def update_many(self, updates: Dict[str, Dict]) -> int:
+        """Update several items, {id: updates}, in one transaction"""
+        conn = get_sqlite_connection()
+        found = 0
+        with conn:
+            for item_id, changes in updates.items():
+                values = dict(zip(self.headers, self._values(changes)))
+                values = {h: values[h] for h in changes}
+                if not values:
+                    continue
+                assignments = ', '.join(f'"{h}" = ?' for h in values)
+                found += conn.execute(
+                    f'UPDATE "{self.table_name}" SET {assignments} '
+                    f'WHERE rowid = (SELECT rowid FROM "{self.table_name}" WHERE id = ? ORDER BY rowid LIMIT 1)',
+                    (*values.values(), str(item_id))
+                ).rowcount
+            if found:
+                self._bump(conn)
+        return found
+
+
+BaseModel = SQLiteModel if Config.USE_SQLITE else CSVModel
+
+
+def _to_date64(value):
+    """Parse a CSV date, treating blanks and junk as NaT"""
+    try:
+        return np.datetime64(value or 'NaT', 'D')
+    except ValueError:
+        return np.datetime64('NaT')
+
+
+def _to_float(value) -> float:
+    """Parse a CSV price, treating blanks and junk as zero"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TransactionModel(BaseModel):
     """Transaction operations"""
     
+    _SHARED_COLUMNS = ('category', 'store', 'date', 'user_id', 'bank_account_id',
+                       'type', 'group_id', 'receipt_group_id')
+    
+    # filename -> (version, columns), shared across instances
+    _columns = {}
+    # String columns kept as arrays, and those also kept lower-cased for
+    # the case-insensitive filters
+    _STRING_COLUMNS = ('id', 'item_name', 'category', 'store', 'user_id',
+                       'bank_account_id', 'type', 'group_id', 'receipt_group_id')
+    _LOWER_COLUMNS = ('item_name', 'category', 'store', 'user_id', 'bank_account_id')
+    
     def __init__(self):
         super().__init__('transactions')
     
+    def columns(self) -> Dict:
+        """Column-oriented view of the table, parsed once per file version
+        
+        Maps each name in _STRING_COLUMNS to a str array, '<name>_lower' to
+        its lower-cased copy, 'date' to datetime64[D], 'month' to the same
+        dates as datetime64[M] and 'price' to float64.
+        'rows' holds the original dicts in the same order for materializing
+        results; they are shared, so copy them before mutating.
+        """
+        version = self.version()
+        cached = self._columns.get(self.filename)
+        if cached is None or cached[0] != version:
+            rows = self._rows()
+            cols = {'rows': rows}
+            for name in self._STRING_COLUMNS:
+                cols[name] = np.array([t[name] or '' for t in rows], dtype=str)
+            for name in self._LOWER_COLUMNS:
+                cols[name + '_lower'] = np.char.lower(cols[name])
+            try:
+                cols['date'] = np.array([t['date'] or 'NaT' for t in rows], dtype='datetime64[D]')
+            except ValueError:
+                # Hand-edited CSV with a malformed date; parse row by row
+                cols['date'] = np.array([_to_date64(t['date']) for t in rows], dtype='datetime64[D]')
+            cols['month'] = cols['date'].astype('datetime64[M]')
+            cols['price'] = np.fromiter((_to_float(t['price']) for t in rows),
+                                        dtype=np.float64, count=len(rows))
+            cached = (version, cols)
+            self._columns[self.filename] = cached
+        return cached[1]
+    
     def create(self, data: Dict) -> Dict:
         """Create new transaction"""
-        transaction = {
+        transaction = self._new(data)
+        self.write_row(transaction)
+        return transaction
+    
+    def create_many(self, items: List[Dict]) -> List[Dict]:
+        """Create several transactions with a single write"""
+        transactions = [self._new(data) for data in items]
+        self.write_rows(transactions)
+        return transactions
+    
+    def _new(self, data: Dict) -> Dict:
+        """Build a transaction row with a freshly allocated id"""
+        return {
             'id': str(self.get_next_id()),
             'item_name': data.get('item_name', 'Unknown'),
             'category': data.get('category', 'Other'),
@@ -112,50 +704,74 @@ class TransactionModel(CSVModel):
             'group_id': data.get('group_id', ''),
             'receipt_group_id': data.get('receipt_group_id', '')
         }
-        self.write_row(transaction)
-        return transaction
     
     def filter(self, filters: Dict) -> List[Dict]:
         """Filter transactions"""
-        transactions = self.read_all()
+        rows = self.columns()['rows']
+        return [dict(rows[i]) for i in np.flatnonzero(self._filter_mask(filters))]
+    
+    def prices(self, filters: Dict) -> np.ndarray:
+        """Prices of the transactions filter() would return, in the same order"""
+        return self.columns()['price'][self._filter_mask(filters)]
+    
+    def totals_by(self, column: str, filters: Dict) -> Dict[str, float]:
+        """Total price of the filtered transactions per value of a columns() array"""
+        cols = self.columns()
+        mask = self._filter_mask(filters)
+        keys, codes = np.unique(cols[column][mask], return_inverse=True)
+        totals = np.bincount(codes, weights=cols['price'][mask], minlength=len(keys))
+        return dict(zip(keys.tolist(), totals.tolist()))
+    
+    def _filter_mask(self, filters: Dict) -> np.ndarray:
+        """Which rows of columns() match the filters"""
+        cols = self.columns()
+        mask = np.ones(len(cols['rows']), dtype=bool)
         
         if filters.get('category'):
-            transactions = [t for t in transactions 
-                          if t['category'].lower() == filters['category'].lower()]
+            mask &= cols['category_lower'] == filters['category'].lower()
         
         if filters.get('store'):
-            transactions = [t for t in transactions 
-                          if filters['store'].lower() in t['store'].lower()]
+            mask &= np.char.find(cols['store_lower'], filters['store'].lower()) >= 0
         
         if filters.get('user_id'):
-            transactions = [t for t in transactions 
-                          if str(t.get('user_id','')).lower() == str(filters['user_id']).lower()]
+            mask &= cols['user_id_lower'] == str(filters['user_id']).lower()
         
         if filters.get('bank_account_id'):
-            transactions = [t for t in transactions 
-                          if t['bank_account_id'].lower() == filters['bank_account_id'].lower()]
+            mask &= cols['bank_account_id_lower'] == filters['bank_account_id'].lower()
         
-        if filters.get('start_date'):
-            transactions = [t for t in transactions 
-                          if t['date'] >= filters['start_date']]
+        if filters.get('group_id'):
+            mask &= cols['group_id'] == str(filters['group_id'])
         
-        if filters.get('end_date'):
-            transactions = [t for t in transactions 
-                          if t['date'] <= filters['end_date']]
+        start = self._date_bound(filters.get('start_date'))
+        if start is not None:
+            mask &= cols['date'] >= start
+        
+        end = self._date_bound(filters.get('end_date'))
+        if end is not None:
+            mask &= cols['date'] <= end
         
         if filters.get('q'):
             q = filters['q'].lower()
-            transactions = [t for t in transactions 
-                          if q in t['item_name'].lower() or q in t['store'].lower()]
+            mask &= (np.char.find(cols['item_name_lower'], q) >= 0) | \
+                    (np.char.find(cols['store_lower'], q) >= 0)
         
         if filters.get('type'):
-            transactions = [t for t in transactions 
-                          if t.get('type', 'expense') == filters['type']]
+            mask &= cols['type'] == filters['type']
         
-        return transactions
+        return mask
+    
+    @staticmethod
+    def _date_bound(value):
+        """A date filter as a day, or None when it is missing or unparseable"""
+        if not value:
+            return None
+        try:
+            return np.datetime64(value, 'D')
+        except ValueError:
+            return None
 
 
-class BudgetModel(CSVModel):
+class BudgetModel(BaseModel):
     """Budget operations"""
     
     def __init__(self):
@@ -176,13 +792,15 @@ class BudgetModel(CSVModel):
     
     def get_by_user(self, user_id: str) -> List[Dict]:
         """Get budgets for a specific user"""
-        budgets = self.read_all()
-        return [b for b in budgets if b.get('user_id') == user_id]
+        return self._where('user_id', user_id)
 
 
-class RecurringModel(CSVModel):
+class RecurringModel(BaseModel):
     """Recurring transaction operations"""
     
+    _SHARED_COLUMNS = ('category', 'store', 'user_id', 'bank_account_id', 'type',
+                       'frequency', 'active', 'group_id')
+    
     def __init__(self):
         super().__init__('recurring')
     
@@ -207,21 +825,20 @@ class RecurringModel(CSVModel):
     
     def toggle(self, item_id: int) -> bool:
         """Toggle active status"""
-        items = self.read_all()
-        for item in items:
-            if int(item['id']) == item_id:
-                item['active'] = 'false' if item['active'] == 'true' else 'true'
-                self.rewrite_all(items)
-                return True
-        return False
-    
-    def get_active(self) -> List[Dict]:
-        """Get all active recurring transactions"""
-        items = self.read_all()
-        return [item for item in items if item['active'] == 'true']
+        position = self._position(item_id)
+        if position is None:
+            return False
+        item = self._rows()[position]
+        return self.update_by_id(item_id, {'active': 'false' if item['active'] == 'true' else 'true'})
+    
+    def get_active(self, user_id: str = None) -> List[Dict]:
+        """Get all active recurring transactions, or only a user's"""
+        # Filter on the shared rows so only the matches are copied
+        return [dict(item) for item in self.iter_rows()
+                if item['active'] == 'true' and (user_id is None or item['user_id'] == user_id)]
 
 
-class AccountModel(CSVModel):
+class AccountModel(BaseModel):
     """Account operations"""
     
     def __init__(self):
@@ -240,11 +857,10 @@ class AccountModel(CSVModel):
     
     def get_by_user(self, user_id: str) -> List[Dict]:
         """Get accounts for a specific user"""
-        accounts = self.read_all()
-        return [a for a in accounts if a.get('user_id') == user_id]
+        return self._where('user_id', user_id)
 
 
-class GroupModel(CSVModel):
+class GroupModel(BaseModel):
     """Group operations"""
     
     def __init__(self):
@@ -264,46 +880,92 @@ class GroupModel(CSVModel):
         self.write_row(group)
         return group
     
+    # filename -> (rows, {group id: members}, {member id: [row positions]})
+    _members = {}
+    
+    def _member_index(self):
+        """Parsed member lists, rebuilt whenever the cached rows are"""
+        rows = self._rows()
+        cached = self._members.get(self.filename)
+        if cached is None or cached[0] is not rows:
+            by_group, by_member = {}, {}
+            for position, group in enumerate(rows):
+                members = group['members'].split(',')
+                by_group[group['id']] = members
+                for member_id in dict.fromkeys(members):
+                    by_member.setdefault(member_id, []).append(position)
+            cached = self._members[self.filename] = (rows, by_group, by_member)
+        return cached
+    
     def get_by_member(self, user_id: str) -> List[Dict]:
         """Get all groups a user is a member of"""
-        groups = self.read_all()
-        return [g for g in groups if user_id in g['members'].split(',')]
+        rows, _, by_member = self._member_index()
+        return [dict(rows[position]) for position in by_member.get(user_id, [])]
+    
+    def get_group_ids(self, user_id: str) -> frozenset:
+        """Ids of the groups a user is a member of"""
+        rows, _, by_member = self._member_index()
+        return frozenset(rows[position]['id'] for position in by_member.get(user_id, []))
     
     def get_members(self, group_id: int) -> List[str]:
         """Get members of a group"""
-        group = self.find_by_id(group_id)
-        if group:
-            return group['members'].split(',')
-        return []
+        return list(self._member_index()[1].get(str(group_id), []))
 
 
-class SplitModel(CSVModel):
+class SplitModel(BaseModel):
     """Split operations"""
     
+    _SHARED_COLUMNS = ('receipt_group_id', 'user_id', 'percentage')
+    
     def __init__(self):
         super().__init__('splits')
     
     def create(self, data: Dict) -> Dict:
         """Create new split"""
-        split = {
+        split = self._new(data)
+        self.write_row(split)
+        return split
+    
+    def create_many(self, items: List[Dict]) -> List[Dict]:
+        """Create several splits with a single write"""
+        splits = [self._new(data) for data in items]
+        self.write_rows(splits)
+        return splits
+    
+    def _new(self, data: Dict) -> Dict:
+        """Build a split row with a freshly allocated id"""
+        return {
             'id': str(self.get_next_id()),
             'receipt_group_id': data.get('receipt_group_id'),
             'user_id': data.get('user_id'),
             'amount': str(data.get('amount')),
             'percentage': str(data.get('percentage', 0))
         }
-        self.write_row(split)
-        return split
+    
+    # filename -> (rows, {receipt group id: [splits]}); rebuilt with the rows
+    _receipt_groups = {}
+    
+    def _receipt_index(self) -> Dict[str, List[Dict]]:
+        """Splits bucketed by receipt group, built once per table version"""
+        rows = self._rows()
+        cached = self._receipt_groups.get(self.filename)
+        if cached is None or cached[0] is not rows:
+            index = {}
+            for split in rows:
+                index.setdefault(split['receipt_group_id'], []).append(split)
+            cached = self._receipt_groups[self.filename] = (rows, index)
+        return cached[1]
     
     def get_by_receipt_group(self, receipt_group_id: str) -> List[Dict]:
         """Get splits for a receipt group"""
-        splits = self.read_all()
-        return [s for s in splits if s['receipt_group_id'] == receipt_group_id]
+        return [dict(split) for split in self._receipt_index().get(receipt_group_id, [])]
 
 
-class NotificationModel(CSVModel):
+class NotificationModel(BaseModel):
     """Notification operations"""
     
+    _SHARED_COLUMNS = ('user_id', 'type', 'read')
+    
     def __init__(self):
         super().__init__('notifications')
     
@@ -324,11 +986,12 @@ class NotificationModel(CSVModel):
     
     def get_by_user(self, user_id: str, unread_only: bool = False) -> List[Dict]:
         """Get notifications for a user"""
-        notifications = self.read_all()
-        user_notifications = [n for n in notifications if n['user_id'] == user_id]
-        
         if unread_only:
-            user_notifications = [n for n in user_notifications if n['read'] == 'false']
+            # Filter on the shared rows so only the unread ones are copied
+            user_notifications = [dict(n) for n in self.iter_rows()
+                                  if n['user_id'] == user_id and n['read'] == 'false']
+        else:
+            user_notifications = self._where('user_id', user_id)
         
         # Sort by date descending
         user_notifications.sort(key=lambda x: x['date'], reverse=True)
@@ -340,17 +1003,38 @@ class NotificationModel(CSVModel):
     
     def mark_all_read(self, user: str) -> int:
         """Mark all notifications as read for a user"""
-        notifications = self.read_all()
+        # Shallow copy: only the notifications being marked are replaced
+        notifications = list(self._rows())
         count = 0
-        for notification in notifications:
+        for position, notification in enumerate(notifications):
             if notification.get('user_id') == user and notification['read'] == 'false':
-                notification['read'] = 'true'
+                notifications[position] = {**notification, 'read': 'true'}
                 count += 1
         if count > 0:
             self.rewrite_all(notifications)
         return count
     
+    # filename -> (rows, {user id: unread count}); rebuilt with the rows
+    _unread_counts = {}
+    
     def get_unread_count(self, user: str) -> int:
         """Get count of unread notifications"""
-        notifications = self.get_by_user(user, unread_only=True)
-        return len(notifications)
\ No newline at end of file
+        # Any write replaces the cached rows, so the counts never go stale,
+        # even when another worker made the change
+        rows = self._rows()
+        cached = self._unread_counts.get(self.filename)
+        if cached is None or cached[0] is not rows:
+            counts = Counter(n['user_id'] for n in rows if n['read'] == 'false')
+            cached = self._unread_counts[self.filename] = (rows, counts)
+        return cached[1][user]
+
+
+def flush_all():
+    """Write out rows and rewrites buffered by every model (BUFFER_CSV_WRITES)"""
+    for model_class in BaseModel.__subclasses__():
+        if model_class is not SQLiteModel:
+            model = model_class()
+            model.flush()
+            model.write_back()
+
+atexit.register(flush_all)
@@ -3,21 +3,37 @@ API endpoints for AJAX requests
 Comprehensive REST API for frontend communication
 """
 
-from flask import Blueprint, jsonify, request
-from auth import login_required, get_current_user, admin_required, get_user_by_id, get_user_by_full_name
+from flask import Blueprint, jsonify, request, current_app, session
+from auth import (
+    login_required, get_current_user, admin_required, get_user_names, users_version,
+    read_public_users, create_user, update_user, delete_user
+)
 from models import (
     TransactionModel, BudgetModel, RecurringModel, 
     AccountModel, GroupModel, SplitModel, NotificationModel
 )
 from services.notification_service import notification_service
 from services.analytics_service import analytics_service
-from utils.helpers import filter_by_person_access, get_person_groups
-from utils.decorators import api_response
-from datetime import datetime, timedelta
-import json
+from utils.helpers import filter_by_person_access, get_person_groups, get_recent_months, is_iso_date
+from utils.decorators import api_response, conditional_etag
+from config import Config
+from datetime import datetime, date
+from collections import OrderedDict
+import threading
+import numpy as np
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Serialized dashboard payloads, least recently used first
+_DASH_CACHE = OrderedDict()
+_DASH_CACHE_SIZE = 64
+_DASH_LOCK = threading.Lock()
+
+# (groups version, users version, person id) -> sorted people they can see.
+# Keying on the versions means a list built from older tables is never served
+_PERSON_ACCESS = {}
+_PERSON_ACCESS_LOCK = threading.Lock()
+
 # ==================== Dashboard ====================
 
 @api_bp.route('/dashboard-data')
@@ -29,101 +45,151 @@ def get_dashboard_data():
     view_mode = request.args.get('view', 'personal')
     group_id = request.args.get('group_id', '')
     
+    # Any write to a source table changes its version and so misses the cache
+    versions = tuple(model.version() for model in (
+        TransactionModel(), SplitModel(), BudgetModel(), GroupModel()
+    ))
+    today = date.today()
+    key = ('dashboard', user["id"], view_mode, group_id, today, versions)
+    return _cached_json(key, lambda: _dashboard_aggregate(user["id"], view_mode, group_id, today))
+
+def _cached_json(key: tuple, build):
+    """JSON response for key from _DASH_CACHE, calling build() on a miss
+    
+    Keys carry the versions of every table the payload reads, so entries
+    never go stale; old ones just age out of the LRU.
+    """
+    with _DASH_LOCK:
+        body = _DASH_CACHE.get(key)
+        if body is not None:
+            _DASH_CACHE.move_to_end(key)
+    if body is None:
+        body = current_app.json.response(build()).get_data()
+        with _DASH_LOCK:
+            _DASH_CACHE[key] = body
+            if len(_DASH_CACHE) > _DASH_CACHE_SIZE:
+                _DASH_CACHE.popitem(last=False)
+    return current_app.response_class(body, mimetype='application/json')
+
+def _dashboard_aggregate(user_id: str, view_mode: str, group_id: str, today: date) -> dict:
+    """Compute the dashboard payload for one user and view"""
     transaction_model = TransactionModel()
     budget_model = BudgetModel()
     split_model = SplitModel()
     
-    # Get transactions based on view
+    # Work on the table's cached column arrays, so prices are parsed once per
+    # file version rather than once per row per request
+    cols = transaction_model.columns()
+    
+    # Select transactions based on view
     if view_mode == 'group' and group_id:
-        transactions = [t for t in transaction_model.read_all() if t.get('group_id') == group_id]
+        selected = cols['group_id'] == group_id
     else:
-        transactionAll = transaction_model.read_all()
-        transactions = filter_by_person_access(transactionAll, user["id"])
-        print("Got transactions")
+        # Same rule as filter_by_person_access: own rows, rows of the user's
+        # groups, and rows with no group
+        visible = list(GroupModel().get_group_ids(user_id) | {''})
+        selected = (cols['user_id'] == user_id) | np.isin(cols['group_id'], visible)
     
     # Calculate basic stats
-    now = datetime.now()
-    current_month = now.strftime('%Y-%m')
-    
-    monthly_spending = {}
-    monthly_income = {}
-    for i in range(6):
-        m = (now - timedelta(days=30*i)).strftime('%Y-%m')
-        monthly_spending[m] = 0
-        monthly_income[m] = 0
-    
-    category_spending = {}
-    account_spending = {}
-    total_income = 0
-    total_expenses = 0
-    month_income = 0
-    month_expenses = 0
-    
-    splits = split_model.read_all()
-    for t in transactions:
-        # Handle splits
-        receipt_group_id = t.get('receipt_group_id', '')
-        if receipt_group_id:
-            t_splits = [s for s in splits if s['receipt_group_id'] == receipt_group_id]
-            if t_splits:
-                person_split = next((s for s in t_splits if s['user_id'] == user["id"]), None)
-                if not person_split:
-                    continue
-                total_receipt = sum(float(tr.get('price', 0)) for tr in transactions 
-                                  if tr.get('receipt_group_id') == receipt_group_id)
-                if total_receipt > 0:
-                    split_ratio = float(person_split['amount']) / total_receipt
-                    price = float(t.get('price', 0)) * split_ratio
-                else:
-                    price = 0
-            else:
-                price = float(t.get('price', 0))
-        else:
-            if t.get('user_id') != user["id"]:
-                continue
-            price = float(t.get('price', 0))
-        
-        month = t['date'][:7]
-        is_income = t.get('type', 'expense') == 'income'
-        
-        if is_income:
-            total_income += price
-            if month in monthly_income:
-                monthly_income[month] += price
-            if month == current_month:
-                month_income += price
+    current_month = today.strftime('%Y-%m')
+    
+    # Oldest month first, so the chart series run chronologically
+    sorted_months = get_recent_months(6, today)
+    month_index = {m: i for i, m in enumerate(sorted_months)}
+    
+    prices = cols['price'][selected]
+    receipt_ids = cols['receipt_group_id'][selected]
+    on_receipt = receipt_ids != ''
+    # Rows outside a receipt group count only for their owner
+    keep = on_receipt | (cols['user_id'][selected] == user_id)
+    
+    # Receipt totals in one pass, then each group's splits and this user's
+    # share looked up once; a split receipt the user has no share of is
+    # dropped, and one without splits counts in full
+    rgids, receipt_of = np.unique(receipt_ids[on_receipt], return_inverse=True)
+    receipt_totals = np.bincount(receipt_of, weights=prices[on_receipt], minlength=len(rgids))
+    is_split = np.zeros(len(rgids), dtype=bool)
+    has_share = np.ones(len(rgids), dtype=bool)
+    shares = np.zeros(len(rgids))
+    for i, rgid in enumerate(rgids.tolist()):
+        group_splits = split_model.get_by_receipt_group(rgid)
+        if not group_splits:
+            continue
+        is_split[i] = True
+        person_split = next((s for s in group_splits if s['user_id'] == user_id), None)
+        if person_split:
+            shares[i] = float(person_split['amount'])
         else:
-            total_expenses += price
-            if month in monthly_spending:
-                monthly_spending[month] += price
-            if month == current_month:
-                month_expenses += price
-            cat = t.get('category', 'Other')
-            category_spending[cat] = category_spending.get(cat, 0) + price
-            acc = t.get('bank_account_id', 'Unknown')
-            account_spending[acc] = account_spending.get(acc, 0) + price
-    
-    sorted_months = sorted(monthly_spending.keys())
+            has_share[i] = False
+    # The user's share of each split receipt's total, 0 for an empty receipt
+    ratios = np.divide(shares, receipt_totals, out=np.zeros(len(rgids)), where=receipt_totals > 0)
+    ratios[~is_split] = 1.0
+    receipt_prices = prices[on_receipt] * ratios[receipt_of]
+    prices = prices.copy()
+    prices[on_receipt] = np.where(ratios[receipt_of] == 0.0, 0.0, receipt_prices)
+    keep[on_receipt] = has_share[receipt_of]
+    
+    prices = prices[keep]
+    income = cols['type'][selected][keep] == 'income'
+    expenses = ~income
+    
+    total_income = float(prices[income].sum())
+    total_expenses = float(prices[expenses].sum())
+    
+    # Month buckets by matching each date's month against the chart's months
+    months = cols['month'][selected][keep]
+    chart_months = np.array(sorted_months, dtype='datetime64[M]')
+    month_idx = np.searchsorted(chart_months, months)
+    in_range = month_idx < len(chart_months)
+    in_range[in_range] = chart_months[month_idx[in_range]] == months[in_range]
+    
+    # Categories and accounts are numbered in first-seen order among
+    # expenses so the chart labels keep their old order
+    def first_seen_codes(values):
+        labels, first, codes = np.unique(values, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        rank = np.empty(len(order), dtype=np.intp)
+        rank[order] = np.arange(len(order))
+        return labels[order].tolist(), rank[codes]
+    
+    category_labels, category_idx = first_seen_codes(cols['category'][selected][keep][expenses])
+    account_labels, account_idx = first_seen_codes(cols['bank_account_id'][selected][keep][expenses])
+    
+    # Scatter-add each column into its buckets in one C pass
+    income_by_month = np.bincount(month_idx[income & in_range], weights=prices[income & in_range],
+                                  minlength=len(sorted_months))
+    spending_by_month = np.bincount(month_idx[expenses & in_range], weights=prices[expenses & in_range],
+                                    minlength=len(sorted_months))
+    category_totals = np.bincount(category_idx, weights=prices[expenses], minlength=len(category_labels))
+    account_totals = np.bincount(account_idx, weights=prices[expenses], minlength=len(account_labels))
+    
+    spending_series = spending_by_month.tolist()
+    income_series = income_by_month.tolist()
+    month_income = income_series[month_index[current_month]]
+    month_expenses = spending_series[month_index[current_month]]
+    category_spending = dict(zip(category_labels, category_totals.tolist()))
+    account_spending = dict(zip(account_labels, account_totals.tolist()))
+    
     # Budget status
-    budgets = budget_model.get_by_user(user["id"])
+    budgets = budget_model.get_by_user(user_id)
     budget_status = []
+    spent_for = category_spending.get
+    _min = min
     for b in budgets:
-        spent = category_spending.get(b['category'], 0)
+        spent = spent_for(b['category'], 0)
         limit = float(b['amount'])
         budget_status.append({
             'category': b['category'],
             'limit': limit,
             'spent': spent,
             'remaining': limit - spent,
-            'percentage': min((spent / limit * 100) if limit else 0, 100)
+            'percentage': _min((spent / limit * 100) if limit else 0, 100)
         })
-
-    
     
     return {
         'monthly_labels': sorted_months,
-        'monthly_spending': [monthly_spending[m] for m in sorted_months],
-        'monthly_income': [monthly_income[m] for m in sorted_months],
+        'monthly_spending': spending_series,
+        'monthly_income': income_series,
         'category_labels': list(category_spending.keys()),
         'category_values': list(category_spending.values()),
         'account_labels': list(account_spending.keys()),
@@ -141,12 +207,15 @@ def get_dashboard_data():
 # @api_response
 def get_dashboard_enhanced():
     """Get enhanced dashboard data with analytics"""
-    person = json.loads(request.args.get("person"))
+    user = get_current_user()
     view = request.args.get('view', 'personal')
     group_id = request.args.get('group_id', '')
     
-    data = analytics_service.get_enhanced_dashboard_data(person["id"], group_id)
-    return data
+    versions = tuple(model.version() for model in (
+        TransactionModel(), SplitModel(), BudgetModel(), RecurringModel()
+    ))
+    key = ('enhanced', user["id"], group_id, date.today(), versions)
+    return _cached_json(key, lambda: analytics_service.get_enhanced_dashboard_data(user["id"], group_id))
 
 # ==================== Transactions ====================
 
@@ -159,28 +228,34 @@ def get_transactions():
     
     transaction_model = TransactionModel()
     account_model = AccountModel()
-    transactions = filter_by_person_access(transaction_model.read_all(), user["id"])
-    for t in transactions:
-        if t["receipt_group_id"]:
-            splits = SplitModel().get_by_receipt_group(t["receipt_group_id"])
-            for split in splits:
-                if split["user_id"] == user["id"]:
-                    t["price"] = split["amount"]
-            
-    # Apply filters
+    split_model = SplitModel()
+    
+    # Apply filters as column masks first, so only matching rows are copied
     filters = {}
     for key in ['category', 'store', 'bank_account_id', 'start_date', 'end_date', 'q', 'type', 'user_id']:
         if request.args.get(key):
             filters[key] = request.args.get(key)
     
-    if filters:
-        transactions = transaction_model.filter(filters)
-        transactions = filter_by_person_access(transactions, user["id"])
+    transactions = transaction_model.filter(filters) if filters else transaction_model.read_all()
+    transactions = filter_by_person_access(transactions, user["id"])
+    
+    # One lookup table each, instead of a user and an account fetch per row
+    user_names = get_user_names()
+    account_names = {a['id']: a['name'] for a in account_model.iter_rows()}
+    # receipt group id -> this user's split amount (None if they have none),
+    # looked up once per receipt rather than once per item on it
+    split_amounts = {}
     for t in transactions:
-        name = get_user_by_id(t['user_id'])
-        account = account_model.find_by_id(t['bank_account_id'])
-        t['account_name'] = account['name'] if account else 'Unknown'
-        t['full_name'] = name['full_name'] if name else 'Unknown'
+        receipt_group_id = t["receipt_group_id"]
+        if receipt_group_id:
+            if receipt_group_id not in split_amounts:
+                amounts = [s["amount"] for s in split_model.get_by_receipt_group(receipt_group_id)
+                           if s["user_id"] == user["id"]]
+                split_amounts[receipt_group_id] = amounts[-1] if amounts else None
+            if split_amounts[receipt_group_id] is not None:
+                t["price"] = split_amounts[receipt_group_id]
+        t['account_name'] = account_names.get(t['bank_account_id'], 'Unknown')
+        t['full_name'] = user_names.get(t['user_id'], 'Unknown')
     return transactions
 
 @api_bp.route('/transaction/<int:tid>')
@@ -238,7 +313,6 @@ def mark_all_notifications_read():
 @api_response
 def get_categories():
     """Get all categories"""
-    from config import Config
     return Config.EXPENSE_CATEGORIES
 
 @api_bp.route('/persons')
@@ -248,34 +322,38 @@ def get_persons():
     """Get all persons"""
     user = get_current_user()
     
-    # store final results here
-    all_people = []
-    seen_ids = set()
-    
-    # helper to add people without duplicates
-    def add_person(p):
-        if p["id"] not in seen_ids:
-            all_people.append(p)
-            seen_ids.add(p["id"])
-    
-    # add current user
-    add_person({"id": user["id"], "full_name": user["full_name"]})
-    
-    groups = get_person_groups(user["id"])
+    key = (GroupModel().version(), users_version(), user["id"])
+    people = _PERSON_ACCESS.get(key)
+    if people is None:
+        people = _accessible_people(user)
+        with _PERSON_ACCESS_LOCK:
+            # Entries for earlier table versions can no longer be hit
+            for stale in [k for k in _PERSON_ACCESS if k[:2] != key[:2]]:
+                del _PERSON_ACCESS[stale]
+            _PERSON_ACCESS[key] = people
+    return people
+
+def _accessible_people(user: dict) -> list:
+    """The user plus everyone sharing a group with them, sorted by id"""
+    group_model = GroupModel()
+    user_names = get_user_names()
     
-    for g in groups:
-        for member_id in g["members"].split(","):
-            member = get_user_by_id(member_id)
-            if member:
-                add_person({"id": member["id"], "full_name": member["full_name"]})
+    member_ids = {member_id
+                  for group_id in group_model.get_group_ids(user["id"])
+                  for member_id in group_model.get_members(group_id)}
+    member_ids.discard(user["id"])
     
-    # sort however you want (e.g. by id)
-    return sorted(all_people, key=lambda p: p["id"])
+    people = [{"id": user["id"], "full_name": user["full_name"]}]
+    people.extend({"id": member_id, "full_name": user_names[member_id]}
+                  for member_id in member_ids if member_id in user_names)
+    # Numeric order, so user 10 sorts after user 2
+    return sorted(people, key=lambda p: int(p["id"]))
 
 # ==================== Accounts ====================
 
 @api_bp.route('/accounts')
 @login_required
+@conditional_etag(lambda: AccountModel().version(), users_version)
 @api_response
 def get_accounts():
     """Get user accounts"""
@@ -283,9 +361,9 @@ def get_accounts():
     account_model = AccountModel()
     accounts = account_model.get_by_user(user["id"])
 
+    user_names = get_user_names()
     for a in accounts:
-        user = get_user_by_id(a['user_id'])
-        a['full_name'] = user['full_name'] if user else 'Unknown'
+        a['full_name'] = user_names.get(a['user_id'], 'Unknown')
 
     return accounts
 
@@ -326,6 +404,7 @@ def delete_account(aid):
 
 @api_bp.route('/budgets')
 @login_required
+@conditional_etag(lambda: BudgetModel().version())
 @api_response
 def get_budgets():
     """Get user budgets"""
@@ -372,6 +451,7 @@ def delete_budget(bid):
 
 @api_bp.route('/recurring')
 @login_required
+@conditional_etag(lambda: RecurringModel().version(), lambda: GroupModel().version())
 @api_response
 def get_recurring():
     """Get recurring transactions"""
@@ -386,6 +466,8 @@ def get_recurring():
 def create_recurring():
     """Create recurring transaction"""
     data = request.json
+    if not is_iso_date(data.get('next_date')):
+        return {'success': False, 'error': 'Next date must be YYYY-MM-DD'}
     if not data.get('user_id'):
         user = get_current_user()
         data['user_id'] = user['id']
@@ -416,19 +498,22 @@ def toggle_recurring(rid):
 
 @api_bp.route('/groups')
 @login_required
+@conditional_etag(lambda: GroupModel().version(), users_version)
 @api_response
 def get_groups():
     """Get user groups"""
     user = get_current_user()
     person = user['id']
     groups = get_person_groups(person)
+    group_model = GroupModel()
+    user_names = get_user_names()
     groupMembers = []
     for group in groups:
         modifiedGroup = group
         names = []
         ids = []
-        for id in group["members"].split(','):
-            names.append(get_user_by_id(id)["full_name"])
+        for id in group_model.get_members(group["id"]):
+            names.append(user_names[id])
             ids.append(id)
         
         modifiedGroup["names"] = names
@@ -502,23 +587,17 @@ def get_splits(tid):
 
 @api_bp.route('/admin/users')
 @admin_required
+@conditional_etag(users_version)
 @api_response
 def get_all_users():
     """Get all users (admin only)"""
-    from auth import read_users
-    users = read_users()
-    # Remove password hashes
-    for user in users:
-        user.pop('password_hash', None)
-    return users
+    return read_public_users()
 
 @api_bp.route('/admin/users', methods=['POST'])
 @admin_required
 @api_response
 def create_new_user():
     """Create new user (admin only)"""
-    from auth import create_user
-    
     data = request.json
     username = data.get('username')
     password = data.get('password')
@@ -541,7 +620,6 @@ def create_new_user():
 @api_response
 def update_user_admin(uid):
     """Update user (admin only)"""
-    from auth import update_user
     data = request.json
     update_user(uid, data)
     return {'success': True}
@@ -551,10 +629,7 @@ def update_user_admin(uid):
 @api_response
 def deactivate_user(uid):
     """Deactivate user (admin only)"""
-    from flask import session
-    from auth import delete_user
-    
-    if int(uid) == int(session['user_id']):
+    if str(uid) == session['user_id']:
         return {'success': False, 'error': 'Cannot delete your own account'}, 400
     
     delete_user(uid)
@@ -570,7 +645,7 @@ def admin_assign_group():
     members = data.get('members', [])
     
     group_model = GroupModel()
-    success = group_model.update_by_id(int(group_id), {
+    success = group_model.update_by_id(group_id, {
         'members': ','.join(members)
     })
     
@@ -5,10 +5,10 @@ Main dashboard and core page routes
 from flask import Blueprint, render_template, redirect, url_for, request, flash, session
 from auth import (
     login_required, get_current_user, verify_password, 
-    get_user_by_username, must_change_password, change_password
+    get_user_by_username, must_change_password, change_password,
+    create_reset_code, send_reset_email, verify_reset_code, use_reset_code
 )
 from utils.helpers import get_person_groups
-from services.recurring_processor import process_recurring_transactions
 from services.notification_service import notification_service
 
 main_bp = Blueprint('main', __name__)
@@ -72,7 +72,6 @@ def forgot_password():
     """Forgot password page"""
     if request.method == 'POST':
         username = request.form.get('username')
-        from auth import create_reset_code, send_reset_email, get_user_by_username
         
         user = get_user_by_username(username)
         if user:
@@ -97,8 +96,6 @@ def reset_password():
         new_password = request.form.get('new_password')
         confirm_password = request.form.get('confirm_password')
         
-        from auth import verify_reset_code, use_reset_code, get_user_by_username
-        
         if not verify_reset_code(username, code):
             flash('Invalid or expired reset code.', 'danger')
         elif len(new_password) < 8:
@@ -122,9 +119,6 @@ def dashboard():
     user = get_current_user()
     person = {"id":user["id"], "full_name":user["full_name"]}
     
-    # Process recurring transactions
-    process_recurring_transactions()
-    
     # Check for alerts and reminders
     notification_service.check_budget_alerts(person['id'])
     notification_service.check_recurring_reminders(person['id'])
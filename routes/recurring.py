@@ -4,6 +4,7 @@ Recurring transaction routes
 
 from flask import Blueprint, render_template
 from auth import login_required, get_current_user
+from models import AccountModel
 from utils.helpers import get_person_groups
 from config import Config
 
@@ -17,7 +18,6 @@ def recurring_page():
     person = {"id":user["id"], "full_name":user["full_name"]}
     groups = get_person_groups(person["id"])
     
-    from models import AccountModel
     account_model = AccountModel()
     accounts = account_model.get_by_user(person["id"])
     
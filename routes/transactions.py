@@ -3,20 +3,40 @@ Transaction routes - Upload, manual entry, search
 """
 
 from flask import Blueprint, render_template, request, jsonify, send_from_directory
-from auth import login_required, get_current_user, get_user_by_id
-from models import TransactionModel, SplitModel, AccountModel
+from auth import login_required, get_current_user, get_user_names
+from models import TransactionModel, SplitModel, AccountModel, GroupModel
 from services.azure_service import azure_service
 from services.notification_service import notification_service
 from utils.helpers import (
     save_receipt_image, get_person_groups, 
-    calculate_splits, generate_unique_id
+    calculate_splits, generate_unique_id, is_iso_date
 )
 from config import Config
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+from typing import Tuple
 import os
-import shutil
+import hashlib
+import orjson
+import numpy as np
 
 transactions_bp = Blueprint('transactions', __name__)
 
+# Checks run after a save whose outcome the response doesn't include
+_background = ThreadPoolExecutor(max_workers=4, thread_name_prefix='post-save')
+
+# Azure calls for batch uploads; they mostly wait on the network
+_scanners = ThreadPoolExecutor(max_workers=8, thread_name_prefix='receipt-scan')
+
+def _check_large_transaction(user_id: str, amount: float, item_name: str):
+    """Run the large-transaction alert off the request thread"""
+    def check():
+        try:
+            notification_service.check_large_transaction_alert(user_id, amount, item_name)
+        except Exception as e:
+            print(f"Large transaction alert failed: {e}")
+    _background.submit(check)
+
 @transactions_bp.route('/upload')
 @login_required
 def upload_page():
@@ -25,7 +45,6 @@ def upload_page():
     person = {"id":user["id"], "full_name":user["full_name"]}
     groups = get_person_groups(person["id"])
     
-    from models import AccountModel
     account_model = AccountModel()
     accounts = account_model.get_by_user(person["id"])
     
@@ -48,12 +67,14 @@ def manual_page():
     account_model = AccountModel()
     accounts = account_model.get_by_user(person["id"])
     
+    group_model = GroupModel()
+    user_names = get_user_names()
     groupMembers = []
     for group in groups:
         modifiedGroup = group
         names = []
-        for id in group["members"].split(','):
-            names.append(get_user_by_id(id)["full_name"])
+        for id in group_model.get_members(group["id"]):
+            names.append(user_names[id])
         
         modifiedGroup["names"] = names
         groupMembers.append(modifiedGroup)
@@ -90,42 +111,137 @@ def serve_receipt(filename):
 @transactions_bp.route('/api/upload', methods=['POST'])
 @login_required
 def upload_receipt():
-    """Upload and process receipt"""
-    if 'file' not in request.files:
-        return jsonify({'success': False, 'error': 'No file'}), 400
+    """Upload and process receipt
+    
+    Accepts a multipart form with a 'file' field, or the raw file as an
+    application/octet-stream body named by an X-Filename header. The raw
+    form is copied straight to disk, skipping the multipart parser.
+    """
+    raw = request.mimetype == 'application/octet-stream'
+    if raw:
+        file = None
+        filename = unquote(request.headers.get('X-Filename', ''))
+    else:
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': 'No file'}), 400
+        file = request.files['file']
+        filename = file.filename
+    
+    error = _receipt_error(filename)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    temp_path, receipt_filename = _store_upload(request.stream if raw else file.stream, filename)
+    return jsonify(_scan_receipt(temp_path, receipt_filename))
+
+@transactions_bp.route('/api/upload-batch', methods=['POST'])
+@login_required
+def upload_receipts():
+    """Upload and process several receipts at once
     
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'success': False, 'error': 'No file selected'}), 400
+    Takes a multipart form with any number of 'files' fields and scans them
+    with Azure concurrently, so prefer it over repeated /api/upload calls.
+    Results come back in upload order.
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'success': False, 'error': 'No files'}), 400
     
-    from werkzeug.utils import secure_filename
-    if not file or not '.' in file.filename:
-        return jsonify({'success': False, 'error': 'Invalid file'}), 400
+    results = [None] * len(files)
+    uploads = []
+    for i, file in enumerate(files):
+        error = _receipt_error(file.filename)
+        if error:
+            results[i] = {'success': False, 'error': error}
+        else:
+            uploads.append((i, *_store_upload(file.stream, file.filename)))
     
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    if ext not in Config.ALLOWED_EXTENSIONS:
-        return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+    scans = _scanners.map(lambda upload: _scan_batch_receipt(*upload[1:]), uploads)
+    for (i, *_), result in zip(uploads, scans):
+        results[i] = result
     
-    # Save temporarily
-    filename = secure_filename(file.filename)
-    temp_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-    file.save(temp_path)
+    return jsonify({'success': True, 'results': results})
+
+def _scan_batch_receipt(temp_path: str, receipt_filename: str) -> dict:
+    """_scan_receipt for one file of a batch, reporting a failed scan in its slot"""
+    try:
+        return _scan_receipt(temp_path, receipt_filename)
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+def _receipt_error(filename: str):
+    """Why a file can't be taken as a receipt, or None if it can"""
+    if filename == '':
+        return 'No file selected'
+    
+    _, dot, ext = filename.rpartition('.')
+    if not dot:
+        return 'Invalid file'
+    
+    if ext.lower() not in Config.ALLOWED_EXTENSIONS:
+        return 'Invalid file type'
+    
+    return None
+
+def _store_upload(source, filename: str) -> Tuple[str, str]:
+    """Copy an upload to a temp file; returns its path and the name to keep it under
+    
+    The temp file sits next to its final location so keeping it is a rename,
+    not a copy. The kept name is the content's hash, so uploading the same
+    receipt again reuses its first scan instead of calling Azure.
+    """
+    ext = filename.rpartition('.')[2].lower()
+    temp_path = os.path.join(Config.RECEIPT_FOLDER, f"{generate_unique_id()}.{ext}.part")
+    digest = hashlib.sha256()
+    with open(temp_path, 'wb', buffering=1 << 20) as dst:
+        for chunk in iter(lambda: source.read(1 << 16), b''):
+            digest.update(chunk)
+            dst.write(chunk)
+    
+    return temp_path, f"{digest.hexdigest()[:24]}.{ext}"
+
+def _scan_receipt(temp_path: str, receipt_filename: str) -> dict:
+    """Scan a stored upload, keeping it under receipt_filename if that works"""
+    permanent_path = os.path.join(Config.RECEIPT_FOLDER, receipt_filename)
+    cache_path = os.path.join(Config.RECEIPT_CACHE_FOLDER, receipt_filename + '.json')
+    
+    result = _cached_scan(cache_path) if os.path.exists(permanent_path) else None
+    if result is not None:
+        os.unlink(temp_path)
+        result['receipt_image'] = receipt_filename
+        return result
     
     # Process with Azure
-    result = azure_service.analyze_receipt(temp_path)
+    try:
+        result = azure_service.analyze_receipt(temp_path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
     
     if result['success']:
-        # Move to permanent storage
-        receipt_filename = f"{generate_unique_id()}.{ext}"
-        permanent_path = os.path.join(Config.RECEIPT_FOLDER, receipt_filename)
-        shutil.move(temp_path, permanent_path)
+        os.replace(temp_path, permanent_path)
+        _cache_scan(cache_path, result)
         result['receipt_image'] = receipt_filename
     else:
         # Clean up temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        os.unlink(temp_path)
     
-    return jsonify(result)
+    return result
+
+def _cached_scan(path: str):
+    """A receipt's earlier scan result, or None if it has none"""
+    try:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+def _cache_scan(path: str, result: dict):
+    """Keep a successful scan result for re-uploads of the same receipt"""
+    temp_path = f"{path}.{generate_unique_id()}.part"
+    with open(temp_path, 'wb') as f:
+        f.write(orjson.dumps(result))
+    os.replace(temp_path, path)
 
 @transactions_bp.route('/api/save-items', methods=['POST'])
 @login_required
@@ -142,6 +258,9 @@ def save_items():
     group_id = data.get('group_id', '')
     splits = data.get('splits', [])
     
+    if not is_iso_date(date):
+        return jsonify({'success': False, 'error': 'Date must be YYYY-MM-DD'}), 400
+    
     # Generate unique receipt group ID
     receipt_group_id = generate_unique_id()
     
@@ -149,34 +268,36 @@ def save_items():
     transaction_model = TransactionModel()
     split_model = SplitModel()
     
-    for item in items:
-        transaction_model.create({
-            'item_name': item.get('name', 'Unknown'),
-            'category': item.get('category', 'Other'),
-            'store': store,
-            'date': date,
-            'price': item.get('price', 0),
-            'user_id': user["id"],
-            'bank_account_id': bank_account_id,
-            'type': 'expense',
-            'receipt_image': receipt_image,
-            'group_id': group_id,
-            'receipt_group_id': receipt_group_id if group_id else ''
-        })
+    # Parse each price once; reused for the stored value and the alert total
+    prices = np.fromiter((float(item.get('price') or 0) for item in items),
+                         dtype=np.float64, count=len(items))
+    
+    transaction_model.create_many([{
+        'item_name': item.get('name', 'Unknown'),
+        'category': item.get('category', 'Other'),
+        'store': store,
+        'date': date,
+        'price': f"{price:.2f}",
+        'user_id': user["id"],
+        'bank_account_id': bank_account_id,
+        'type': 'expense',
+        'receipt_image': receipt_image,
+        'group_id': group_id,
+        'receipt_group_id': receipt_group_id if group_id else ''
+    } for item, price in zip(items, prices)])
     
     # Save splits if group transaction
     if splits and group_id:
-        for split in splits:
-            split_model.create({
-                'receipt_group_id': receipt_group_id,
-                'user_id': split["id"],
-                'amount': split['amount'],
-                'percentage': split.get('percentage', 0)
-            })
+        split_model.create_many([{
+            'receipt_group_id': receipt_group_id,
+            'user_id': split["id"],
+            'amount': split['amount'],
+            'percentage': split.get('percentage', 0)
+        } for split in splits])
     
     # Check for large transaction alert
-    total = sum(float(item.get('price', 0)) for item in items)
-    notification_service.check_large_transaction_alert(user["id"], total, store)
+    total = float(prices.sum())
+    _check_large_transaction(user["id"], total, store)
     
     return jsonify({'success': True, 'saved': len(items)})
 
@@ -187,6 +308,9 @@ def manual_entry():
     user = get_current_user()
     
     data = request.json 
+    if not is_iso_date(data.get('date')):
+        return jsonify({'success': False, 'error': 'Date must be YYYY-MM-DD'}), 400
+    
     group_id = data.get('group_id', '')
     receipt_group_id = generate_unique_id() if group_id else ''
     
@@ -211,17 +335,16 @@ def manual_entry():
     # Save splits
     splits = data.get('splits', [])
     if splits and group_id:
-        for split in splits:
-            split_model.create({
-                'receipt_group_id': receipt_group_id,
-                'user_id': split['user_id'],
-                'amount': split['amount'],
-                'percentage': split.get('percentage', 0)
-            })
+        split_model.create_many([{
+            'receipt_group_id': receipt_group_id,
+            'user_id': split['user_id'],
+            'amount': split['amount'],
+            'percentage': split.get('percentage', 0)
+        } for split in splits])
     
     # Check for alerts
     if data.get('type') == 'expense':
-        notification_service.check_large_transaction_alert(
+        _check_large_transaction(
             user["id"], 
             float(data.get('price', 0)), 
             data.get('item_name', 'Unknown')
@@ -4,11 +4,57 @@ Provides insights, trends, and predictions
 """
 
 from datetime import datetime, timedelta
+from calendar import monthrange
 from typing import Dict, List, Tuple
-from collections import defaultdict
+from collections import namedtuple
 from models import TransactionModel, BudgetModel, RecurringModel, SplitModel
+import numpy as np
 import math
 
+_WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Recurring frequency -> occurrences per month, as multiplier / divisor
+# (yearly divides by 12 rather than multiplying by an inexact 1/12)
+_FREQUENCY_CODES = {'daily': 0, 'weekly': 1, 'biweekly': 2, 'monthly': 3, 'yearly': 4}
+_PER_MONTH = np.array([30, 4, 2, 1, 1], dtype=np.float64)
+_PER_MONTH_DIVISOR = np.array([1, 1, 1, 1, 12], dtype=np.float64)
+
+# Everything the dashboard sections need from the transactions, gathered in
+# a single pass by AnalyticsService._aggregate
+_Aggregates = namedtuple('_Aggregates', [
+    'total_income', 'total_expenses',
+    'monthly',      # month -> {'income': total, 'expenses': total}
+    'categories',   # current month's expenses by category
+    'stores',       # current month's expenses by store
+    'weekdays',     # expenses by day of the week, all time
+    # Individual expense prices, for the figures totalled with sum(): it
+    # compensates rounding error, so it can differ from a running total
+    'category_prices',  # current month, by category
+    'current_prices',   # current month
+    'last_prices',      # last month
+])
+
+def _running_total(values: np.ndarray):
+    """Left-to-right total, as a += loop gives it (np.sum adds pairwise); 0 if empty"""
+    return float(np.cumsum(values)[-1]) if len(values) else 0
+
+
+def _group_totals(keys: np.ndarray, values: np.ndarray) -> Dict:
+    """key -> running total of its values, keys in first-seen order"""
+    labels, first, codes = np.unique(keys, return_index=True, return_inverse=True)
+    totals = np.bincount(codes, weights=values, minlength=len(labels))
+    order = np.argsort(first, kind='stable')
+    return dict(zip(labels[order].tolist(), totals[order].tolist()))
+
+
+def _group_values(keys: np.ndarray, values: np.ndarray) -> Dict[str, List[float]]:
+    """key -> its values in order"""
+    groups = {}
+    for key, value in zip(keys.tolist(), values.tolist()):
+        groups.setdefault(key, []).append(value)
+    return groups
+
+
 class AnalyticsService:
     """Service for dashboard analytics and insights"""
     
@@ -21,49 +67,48 @@ class AnalyticsService:
                                    group_id: str = '') -> Dict:
         """Get comprehensive dashboard data with insights"""
         
-        # Get transactions
-        if group_id:
-            transactions = [t for t in self.transaction_model.read_all() 
-                          if t.get('group_id') == group_id]
-        else:
-            transactions = self.transaction_model.filter({'user_id': user_id})
+        # Get transactions, with their prices already parsed by the model
+        filters = {'group_id': group_id} if group_id else {'user_id': user_id}
+        transactions = self.transaction_model.filter(filters)
+        prices = self.transaction_model.prices(filters)
             
         if not group_id:
-            for t in transactions:
+            for i, t in enumerate(transactions):
                 if t["receipt_group_id"]:
                     splits = SplitModel().get_by_receipt_group(t["receipt_group_id"])
                     for split in splits:
                         if split["user_id"] == user_id:
                             t["price"] = split["amount"]
-
-        # Filter by date range (if start_date/end_date are set elsewhere)
-        transactions = self.transaction_model.filter({"start_date": start_date, "end_date": end_date})
+                            prices[i] = float(split["amount"])
         
         # Time ranges
         now = datetime.now()
         current_month = now.strftime('%Y-%m')
         last_month = (now.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
         
+        # One pass over the transactions feeds every section below
+        aggregates = self._aggregate(transactions, prices, current_month, last_month)
+        
         # Basic statistics
-        basic_stats = self._calculate_basic_stats(transactions, current_month)
+        basic_stats = self._calculate_basic_stats(aggregates, current_month)
         
         # Trends
-        trends = self._calculate_trends(transactions)
+        trends = self._calculate_trends(aggregates)
         
         # Top categories
-        top_categories = self._get_top_categories(transactions, current_month)
+        top_categories = self._get_top_categories(aggregates)
         
         # Top stores
-        top_stores = self._get_top_stores(transactions, current_month)
+        top_stores = self._get_top_stores(aggregates)
         
         # Spending patterns
-        patterns = self._analyze_spending_patterns(transactions)
+        patterns = self._analyze_spending_patterns(aggregates)
         
         # Budget performance
-        budget_performance = self._calculate_budget_performance(user_id, transactions, current_month)
+        budget_performance = self._calculate_budget_performance(user_id, aggregates)
         
         # Predictions
-        predictions = self._predict_month_end(transactions, current_month)
+        predictions = self._predict_month_end(aggregates)
         
         # Insights
         insights = self._generate_insights(
@@ -87,26 +132,78 @@ class AnalyticsService:
             'transactions': transactions
         }
     
-    def _calculate_basic_stats(self, transactions: List[Dict], 
+    def _to_columns(self, transactions: List[Dict], 
+                    prices: np.ndarray = None) -> Dict[str, np.ndarray]:
+        """The fields _aggregate reads, as one array per field
+        
+        prices, when given, are the transactions' prices already parsed.
+        """
+        count = len(transactions)
+        dates = np.array([t['date'] for t in transactions], dtype=str)
+        if prices is None:
+            prices = np.fromiter((float(t.get('price', 0)) for t in transactions),
+                                 dtype=np.float64, count=count)
+        return {
+            'price': prices,
+            'date': dates,
+            'month': dates.astype('U7'),
+            'income': np.fromiter((t.get('type') == 'income' for t in transactions),
+                                  dtype=bool, count=count),
+            'category': np.array([t.get('category', 'Other') for t in transactions], dtype=str),
+            'store': np.array([t.get('store', 'Unknown') for t in transactions], dtype=str),
+        }
+    
+    def _aggregate(self, transactions: List[Dict], prices: np.ndarray, 
+                   current_month: str, last_month: str) -> _Aggregates:
+        """Total the transactions by month, category, store and weekday"""
+        cols = self._to_columns(transactions, prices)
+        prices = cols['price']
+        income = cols['income']
+        expense = ~income
+        
+        # Month -> income/expense totals; a side with no rows stays 0
+        month_labels, month_codes = np.unique(cols['month'], return_inverse=True)
+        monthly = {month: {'income': 0, 'expenses': 0} for month in month_labels.tolist()}
+        for key, mask in (('income', income), ('expenses', expense)):
+            totals = np.bincount(month_codes[mask], weights=prices[mask], minlength=len(month_labels))
+            counts = np.bincount(month_codes[mask], minlength=len(month_labels))
+            for month, total, rows in zip(monthly, totals.tolist(), counts.tolist()):
+                if rows:
+                    monthly[month][key] = total
+        
+        # Expenses by weekday; 1970-01-01 was a Thursday (weekday 3)
+        days = cols['date'][expense].astype('datetime64[D]')
+        dated = ~np.isnat(days)
+        weekday_codes = (days[dated].astype(np.int64) + 3) % 7
+        totals = np.bincount(weekday_codes, weights=prices[expense][dated], minlength=7)
+        counts = np.bincount(weekday_codes, minlength=7)
+        weekdays = {day: total for day, total, rows in zip(_WEEKDAYS, totals.tolist(), counts.tolist())
+                    if rows}
+        
+        this_month = expense & (cols['month'] == current_month)
+        current_prices = prices[this_month]
+        stored = this_month & (cols['store'] != '')
+        
+        return _Aggregates(
+            total_income=_running_total(prices[income]),
+            total_expenses=_running_total(prices[expense]),
+            monthly=monthly,
+            categories=_group_totals(cols['category'][this_month], current_prices),
+            stores=_group_totals(cols['store'][stored], prices[stored]),
+            weekdays=weekdays,
+            category_prices=_group_values(cols['category'][this_month], current_prices),
+            current_prices=current_prices.tolist(),
+            last_prices=prices[expense & (cols['month'] == last_month)].tolist(),
+        )
+    
+    def _calculate_basic_stats(self, aggregates: _Aggregates, 
                               current_month: str) -> Dict:
         """Calculate basic statistics"""
-        total_income = 0
-        total_expenses = 0
-        current_month_income = 0
-        current_month_expenses = 0
-        
-        for t in transactions:
-            price = float(t.get('price', 0))
-            is_income = t.get('type') == 'income'
-            
-            if is_income:
-                total_income += price
-                if t['date'].startswith(current_month):
-                    current_month_income += price
-            else:
-                total_expenses += price
-                if t['date'].startswith(current_month):
-                    current_month_expenses += price
+        total_income = aggregates.total_income
+        total_expenses = aggregates.total_expenses
+        month_totals = aggregates.monthly.get(current_month, {'income': 0, 'expenses': 0})
+        current_month_income = month_totals['income']
+        current_month_expenses = month_totals['expenses']
         
         return {
             'total_income': total_income,
@@ -117,19 +214,9 @@ class AnalyticsService:
             'current_month_balance': current_month_income - current_month_expenses
         }
     
-    def _calculate_trends(self, transactions: List[Dict]) -> Dict:
+    def _calculate_trends(self, aggregates: _Aggregates) -> Dict:
         """Calculate spending trends"""
-        # Group by month
-        monthly_data = defaultdict(lambda: {'income': 0, 'expenses': 0})
-        
-        for t in transactions:
-            month = t['date'][:7]
-            price = float(t.get('price', 0))
-            
-            if t.get('type') == 'income':
-                monthly_data[month]['income'] += price
-            else:
-                monthly_data[month]['expenses'] += price
+        monthly_data = aggregates.monthly
         
         # Get last 6 months
         months = sorted(monthly_data.keys())[-6:]
@@ -157,57 +244,34 @@ class AnalyticsService:
             'trend_direction': 'up' if expense_change > 5 else 'down' if expense_change < -5 else 'stable'
         }
     
-    def _get_top_categories(self, transactions: List[Dict], 
-                           current_month: str, limit: int = 15) -> List[Dict]:
+    def _get_top_categories(self, aggregates: _Aggregates, 
+                           limit: int = 15) -> List[Dict]:
         """Get top spending categories"""
-        category_totals = defaultdict(float)
-        
-        for t in transactions:
-            if t['date'].startswith(current_month) and t.get('type') != 'income':
-                category_totals[t.get('category', 'Other')] += float(t.get('price', 0))
-        
         # Sort and get top N
-        sorted_categories = sorted(category_totals.items(), 
+        sorted_categories = sorted(aggregates.categories.items(), 
                                   key=lambda x: x[1], reverse=True)[:limit]
         
         return [{'category': cat, 'amount': amt} for cat, amt in sorted_categories]
     
-    def _get_top_stores(self, transactions: List[Dict], 
-                       current_month: str, limit: int = 5) -> List[Dict]:
+    def _get_top_stores(self, aggregates: _Aggregates, 
+                       limit: int = 5) -> List[Dict]:
         """Get top stores by spending"""
-        store_totals = defaultdict(float)
-        
-        for t in transactions:
-            if t['date'].startswith(current_month) and t.get('type') != 'income':
-                store = t.get('store', 'Unknown')
-                if store:
-                    store_totals[store] += float(t.get('price', 0))
-        
-        sorted_stores = sorted(store_totals.items(), 
+        sorted_stores = sorted(aggregates.stores.items(), 
                              key=lambda x: x[1], reverse=True)[:limit]
         
         return [{'store': store, 'amount': amt} for store, amt in sorted_stores]
     
-    def _analyze_spending_patterns(self, transactions: List[Dict]) -> Dict:
+    def _analyze_spending_patterns(self, aggregates: _Aggregates) -> Dict:
         """Analyze spending patterns"""
-        day_of_week = defaultdict(float)
-        time_of_day = defaultdict(float)
-        
-        for t in transactions:
-            if t.get('type') != 'income':
-                # Day of week analysis
-                date = datetime.strptime(t['date'], '%Y-%m-%d')
-                day_name = date.strftime('%A')
-                day_of_week[day_name] += float(t.get('price', 0))
+        day_of_week = aggregates.weekdays
+        days = _WEEKDAYS
         
         # Get average spending per day
-        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         avg_by_day = [day_of_week.get(day, 0) for day in days]
         
-        # Find highest spending day
-        if avg_by_day:
-            max_day_index = avg_by_day.index(max(avg_by_day))
-            highest_day = days[max_day_index]
+        # Find highest spending day; none without any dated expenses
+        if day_of_week:
+            highest_day = days[int(np.argmax(avg_by_day))]
         else:
             highest_day = 'N/A'
         
@@ -234,8 +298,7 @@ class AnalyticsService:
         }
     
     def _calculate_budget_performance(self, user_id: str, 
-                                     transactions: List[Dict], 
-                                     current_month: str) -> Dict:
+                                     aggregates: _Aggregates) -> Dict:
         """Calculate budget performance"""
         budgets = self.budget_model.get_by_user(user_id)
         performance = {
@@ -249,13 +312,8 @@ class AnalyticsService:
             category = budget['category']
             limit = float(budget['amount'])
             
-            # Calculate spending
-            category_transactions = [t for t in transactions 
-                                   if t['date'].startswith(current_month) 
-                                   and t.get('category') == category
-                                   and t.get('type') != 'income']
-            
-            spent = sum(float(t.get('price', 0)) for t in category_transactions)
+            # This month's spending in the category
+            spent = sum(aggregates.category_prices.get(category, ()))
             percentage = (spent / limit * 100) if limit > 0 else 0
             
             status = 'good' if percentage < 75 else 'warning' if percentage < 90 else 'critical'
@@ -281,18 +339,14 @@ class AnalyticsService:
         
         return performance
     
-    def _predict_month_end(self, transactions: List[Dict], 
-                          current_month: str) -> Dict:
+    def _predict_month_end(self, aggregates: _Aggregates) -> Dict:
         """Predict end-of-month spending"""
         now = datetime.now()
         days_elapsed = now.day
-        days_in_month = (now.replace(month=now.month % 12 + 1, day=1) - timedelta(days=1)).day
+        days_in_month = monthrange(now.year, now.month)[1]
         
         # Current month spending
-        current_spending = sum(float(t.get('price', 0)) 
-                             for t in transactions 
-                             if t['date'].startswith(current_month) 
-                             and t.get('type') != 'income')
+        current_spending = sum(aggregates.current_prices)
         
         # Daily average
         daily_avg = current_spending / days_elapsed if days_elapsed > 0 else 0
@@ -300,12 +354,8 @@ class AnalyticsService:
         # Projected total
         projected_total = daily_avg * days_in_month
         
-        # Get last month for comparison
-        last_month = (now.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
-        last_month_total = sum(float(t.get('price', 0)) 
-                              for t in transactions 
-                              if t['date'].startswith(last_month) 
-                              and t.get('type') != 'income')
+        # Last month for comparison
+        last_month_total = sum(aggregates.last_prices)
         
         return {
             'current_spending': round(current_spending, 2),
@@ -376,26 +426,15 @@ class AnalyticsService:
     
     def _calculate_recurring_impact(self, user_id: str) -> Dict:
         """Calculate impact of recurring transactions"""
-        recurring_items = [r for r in self.recurring_model.get_active() 
-                          if r.get('user_id') == user_id]
-        
-        monthly_recurring = 0
+        recurring_items = self.recurring_model.get_active(user_id)
         
-        for item in recurring_items:
-            amount = float(item['price'])
-            frequency = item['frequency']
-            
-            # Convert to monthly
-            if frequency == 'daily':
-                monthly_recurring += amount * 30
-            elif frequency == 'weekly':
-                monthly_recurring += amount * 4
-            elif frequency == 'biweekly':
-                monthly_recurring += amount * 2
-            elif frequency == 'monthly':
-                monthly_recurring += amount
-            elif frequency == 'yearly':
-                monthly_recurring += amount / 12
+        # Convert to monthly; an unknown frequency counts for nothing
+        known = [r for r in recurring_items if r['frequency'] in _FREQUENCY_CODES]
+        codes = np.fromiter((_FREQUENCY_CODES[r['frequency']] for r in known),
+                            dtype=np.intp, count=len(known))
+        amounts = np.fromiter((float(r['price']) for r in known),
+                              dtype=np.float64, count=len(known))
+        monthly_recurring = _running_total(amounts * _PER_MONTH[codes] / _PER_MONTH_DIVISOR[codes])
         
         return {
             'monthly_total': round(monthly_recurring, 2),
@@ -406,17 +445,16 @@ class AnalyticsService:
     def get_category_trends(self, user_id: str, category: str, 
                            months: int = 6) -> Dict:
         """Get trends for a specific category"""
-        transactions = self.transaction_model.filter({
+        filters = {
             'user_id': user_id,
             'category': category,
             'type': 'expense'
-        })
+        }
+        transactions = self.transaction_model.filter(filters)
         
         # Group by month
-        monthly_data = defaultdict(float)
-        for t in transactions:
-            month = t['date'][:7]
-            monthly_data[month] += float(t.get('price', 0))
+        cols = self._to_columns(transactions, self.transaction_model.prices(filters))
+        monthly_data = _group_totals(cols['month'], cols['price'])
         
         # Get last N months
         all_months = sorted(monthly_data.keys())[-months:]
@@ -3,17 +3,73 @@ Azure Document Intelligence Service
 Handles receipt scanning and extraction
 """
 
+import re
+import orjson
 import requests
 import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 from config import Config
 
+# Seconds to wait for an analysis result. Without a Retry-After header the
+# gap between polls starts short and backs off to POLL_MAX_INTERVAL
+POLL_TIMEOUT = 30
+POLL_MIN_INTERVAL = 0.2
+POLL_MAX_INTERVAL = 2.0
+POLL_BACKOFF = 1.6
+
+CATEGORY_KEYWORDS = {
+    'Groceries': ['milk', 'bread', 'cheese', 'meat', 'vegetable', 'fruit', 'grocery', 'food'],
+    'Car': ['gas', 'fuel', 'parking', 'toll', 'car wash', 'oil change', 'tire'],
+    'Entertainment': ['movie', 'game', 'concert', 'ticket', 'bowling'],
+    'Subscriptions': ['netflix', 'spotify', 'hulu', 'disney', 'amazon prime', 'subscription'],
+    'Electric': ['electric', 'power', 'utility'],
+    'Medical': ['medicine', 'pharmacy', 'doctor', 'medical', 'health', 'hospital'],
+    'Household': ['cleaning', 'paper towel', 'toilet paper', 'detergent', 'home'],
+    'Eating Out': ['restaurant', 'cafe', 'coffee', 'pizza', 'burger', 'takeout'],
+    'Shopping': ['clothes', 'shoes', 'amazon', 'target', 'clothing'],
+    'Rent': ['rent', 'lease'],
+    'Investment': ['stock', 'etf', 'investment', '401k'],
+}
+
+# keyword -> (priority, category), priority being the category's position above
+_KEYWORD_CATEGORY = {}
+for _rank, (_category, _keywords) in enumerate(CATEGORY_KEYWORDS.items()):
+    for _kw in _keywords:
+        _KEYWORD_CATEGORY.setdefault(_kw, (_rank, _category))
+
+# Single scan over the item name; the lookahead reports a match at every
+# position so overlapping keywords from different categories are all seen
+_KEYWORD_PATTERN = re.compile(
+    '(?=(' + '|'.join(re.escape(kw) for kw in _KEYWORD_CATEGORY) + '))'
+)
+
+def _retry_after(response, default: float) -> float:
+    """Seconds Azure asks us to wait before polling again"""
+    try:
+        return float(response.headers.get('Retry-After', default))
+    except ValueError:
+        return default
+
 class AzureService:
     """Service for Azure Document Intelligence"""
     
     def __init__(self):
         self.endpoint = Config.AZURE_ENDPOINT
         self.key = Config.AZURE_KEY
+        
+        # One keep-alive pool for the analyze POST and every poll, so a
+        # receipt costs one TLS handshake. Retry only covers idempotent
+        # requests (the polls), not the POST.
+        self.session = requests.Session()
+        self.session.headers.update({'Ocp-Apim-Subscription-Key': self.key or ''})
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=64,
+            max_retries=Retry(total=3, backoff_factor=0.5,
+                              status_forcelist=(429, 500, 502, 503, 504))
+        ))
     
     def analyze_receipt(self, image_path: str) -> dict:
         """Analyze receipt with Azure Document Intelligence"""
@@ -22,34 +78,34 @@ class AzureService:
             return self._mock_response()
         
         analyze_url = f"{self.endpoint}/formrecognizer/documentModels/prebuilt-receipt:analyze?api-version=2023-07-31"
-        headers = {
-            'Content-Type': 'application/octet-stream',
-            'Ocp-Apim-Subscription-Key': self.key
-        }
+        headers = {'Content-Type': 'application/octet-stream'}
         
         try:
+            # Stream the image from disk rather than reading it into memory
             with open(image_path, 'rb') as f:
-                image_data = f.read()
-            
-            response = requests.post(analyze_url, headers=headers, data=image_data)
+                response = self.session.post(analyze_url, headers=headers, data=f)
             
             if response.status_code != 202:
                 return {'success': False, 'error': f'Failed: {response.text}'}
             
             operation_url = response.headers.get('Operation-Location')
             
-            # Poll for results
-            for _ in range(30):
-                time.sleep(1)
-                result = requests.get(
-                    operation_url,
-                    headers={'Ocp-Apim-Subscription-Key': self.key}
-                ).json()
+            # Poll for results, waiting as long as Azure suggests between polls
+            deadline = time.monotonic() + POLL_TIMEOUT
+            backoff = POLL_MIN_INTERVAL
+            delay = _retry_after(response, backoff)
+            while time.monotonic() + delay < deadline:
+                time.sleep(delay)
+                poll = self.session.get(operation_url)
+                result = orjson.loads(poll.content)
                 
                 if result.get('status') == 'succeeded':
                     return self._parse_response(result)
                 elif result.get('status') == 'failed':
                     return {'success': False, 'error': 'Analysis failed'}
+                
+                backoff = min(backoff * POLL_BACKOFF, POLL_MAX_INTERVAL)
+                delay = _retry_after(poll, backoff)
             
             return {'success': False, 'error': 'Timeout'}
         
@@ -101,26 +157,12 @@ class AzureService:
     
     def _categorize_item(self, item_name: str) -> str:
         """Categorize item based on name"""
-        item_lower = item_name.lower()
-        mappings = {
-            'Groceries': ['milk', 'bread', 'cheese', 'meat', 'vegetable', 'fruit', 'grocery', 'food'],
-            'Car': ['gas', 'fuel', 'parking', 'toll', 'car wash', 'oil change', 'tire'],
-            'Entertainment': ['movie', 'game', 'concert', 'ticket', 'bowling'],
-            'Subscriptions': ['netflix', 'spotify', 'hulu', 'disney', 'amazon prime', 'subscription'],
-            'Electric': ['electric', 'power', 'utility'],
-            'Medical': ['medicine', 'pharmacy', 'doctor', 'medical', 'health', 'hospital'],
-            'Household': ['cleaning', 'paper towel', 'toilet paper', 'detergent', 'home'],
-            'Eating Out': ['restaurant', 'cafe', 'coffee', 'pizza', 'burger', 'takeout'],
-            'Shopping': ['clothes', 'shoes', 'amazon', 'target', 'clothing'],
-            'Rent': ['rent', 'lease'],
-            'Investment': ['stock', 'etf', 'investment', '401k'],
-        }
-        
-        for category, keywords in mappings.items():
-            if any(kw in item_lower for kw in keywords):
-                return category
+        matches = _KEYWORD_PATTERN.findall(item_name.lower())
+        if not matches:
+            return 'Other'
         
-        return 'Other'
+        # Earliest category in CATEGORY_KEYWORDS wins, as with the old nested scan
+        return min(_KEYWORD_CATEGORY[kw] for kw in matches)[1]
     
     def _mock_response(self) -> dict:
         """Mock response for testing without Azure"""
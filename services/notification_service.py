@@ -4,18 +4,71 @@ Handles budget alerts, recurring transaction reminders, and notifications
 """
 
 import smtplib
+import threading
+import orjson
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 from typing import List, Dict
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from jinja2 import Environment, Template
 from config import Config
 from models import NotificationModel, BudgetModel, RecurringModel, TransactionModel
-from auth import get_user_by_username, get_user_by_id
+from auth import get_user_by_username, get_user_by_id, read_public_users
+
+# Users checked at once by the run_all_* batch methods
+CHECK_WORKERS = 16
+
+# Budget alert email bodies, compiled once; the HTML one escapes its values
+_BUDGET_ALERT_TEXT = Template("""
+Budget Alert: {{ category }}
+
+You've used {{ '%.0f' % percentage }}% of your {{ category }} budget.
+Spent: ${{ '%.2f' % spent }}
+Limit: ${{ '%.2f' % limit }}
+Remaining: ${{ '%.2f' % (limit - spent) }}
+
+{{ '⚠️ Warning: Approaching budget limit' if warning else '🚨 Critical: Over or near budget limit' }}
+
+- Receipt Tracker
+""")
+
+_BUDGET_ALERT_HTML = Environment(autoescape=True).from_string("""
+<html>
+  <body style="font-family: Arial, sans-serif;">
+    <div style="background: {{ color }}; color: white; padding: 20px; text-align: center;">
+      <h2>{{ '⚠️' if warning else '🚨' }} Budget Alert</h2>
+    </div>
+    <div style="padding: 20px;">
+      <h3>{{ category }} Budget</h3>
+      <div style="background: #f8f9fa; padding: 15px; border-radius: 8px;">
+        <p><strong>Usage:</strong> {{ '%.0f' % percentage }}%</p>
+        <div style="background: #dee2e6; height: 20px; border-radius: 10px;">
+          <div style="background: {{ color }}; width: {{ [percentage, 100] | min }}%; height: 20px; border-radius: 10px;"></div>
+        </div>
+        <p><strong>Spent:</strong> ${{ '%.2f' % spent }}</p>
+        <p><strong>Limit:</strong> ${{ '%.2f' % limit }}</p>
+        <p><strong>Remaining:</strong> ${{ '%.2f' % (limit - spent) }}</p>
+      </div>
+      <p style="margin-top: 20px;">
+        {{ "You're approaching your budget limit. Consider reducing spending in this category." if warning
+           else "You've reached or exceeded your budget limit. Please review your spending." }}
+      </p>
+    </div>
+    <div style="background: #f8f9fa; padding: 10px; text-align: center; color: #666;">
+      <small>Receipt Tracker Budget Alert System</small>
+    </div>
+  </body>
+</html>
+""")
 
 class NotificationService:
     """Service for managing notifications and reminders"""
     
     def __init__(self):
+        # Serializes sends over a session shared by a batch's threads
+        self._smtp_lock = threading.Lock()
         self.notification_model = NotificationModel()
         self.budget_model = BudgetModel()
         self.recurring_model = RecurringModel()
@@ -49,28 +102,32 @@ class NotificationService:
         """Get unread notification count"""
         return self.notification_model.get_unread_count(user)
     
-    def check_budget_alerts(self, user_id: str) -> List[Dict]:
-        """Check for budget alerts and create notifications"""
+    def check_budget_alerts(self, user_id: str, smtp: smtplib.SMTP = None) -> List[Dict]:
+        """Check for budget alerts and create notifications
+        
+        Pass an smtp_session() connection to email alerts over it; batch
+        jobs checking many users then log in once for the whole run.
+        """
         alerts = []
+        emails = []
         budgets = self.budget_model.get_by_user(user_id)
         
         # Get current month transactions
         now = datetime.now()
         start_of_month = now.replace(day=1).strftime('%Y-%m-%d')
         
+        # This month's spending per category, totalled once for all budgets
+        spent_by_category = self.transaction_model.totals_by('category_lower', {
+            'user_id': user_id,
+            'start_date': start_of_month,
+            'type': 'expense'
+        })
+        
         for budget in budgets:
             category = budget['category']
             limit = float(budget['amount'])
             
-            # Calculate spending for this category this month
-            transactions = self.transaction_model.filter({
-                'user_id': user_id,
-                'category': category,
-                'start_date': start_of_month,
-                'type': 'expense'
-            })
-            
-            spent = sum(float(t['price']) for t in transactions)
+            spent = spent_by_category.get(category.lower(), 0.0)
             percentage = (spent / limit * 100) if limit > 0 else 0
             
             # Check thresholds
@@ -81,13 +138,13 @@ class NotificationService:
                     type='budget_critical',
                     title=f'🚨 Budget Alert: {category}',
                     message=f'You\'ve used {percentage:.0f}% of your {category} budget (${spent:.2f} of ${limit:.2f})',
-                    data=f'{{"category": "{category}", "spent": {spent}, "limit": {limit}, "percentage": {percentage}}}'
+                    data=orjson.dumps({'category': category, 'spent': spent, 'limit': limit, 'percentage': percentage}).decode()
                 )
                 alerts.append(alert)
                 
                 # Send email if enabled
                 if Config.ENABLE_EMAIL_NOTIFICATIONS:
-                    self._send_budget_alert_email(user_id, category, spent, limit, percentage, 'critical')
+                    emails.append((category, spent, limit, percentage, 'critical'))
             
             elif percentage >= Config.BUDGET_WARNING_THRESHOLD * 100:
                 # Warning: 75%+
@@ -96,29 +153,64 @@ class NotificationService:
                     type='budget_warning',
                     title=f'⚠️ Budget Warning: {category}',
                     message=f'You\'ve used {percentage:.0f}% of your {category} budget (${spent:.2f} of ${limit:.2f})',
-                    data=f'{{"category": "{category}", "spent": {spent}, "limit": {limit}, "percentage": {percentage}}}'
+                    data=orjson.dumps({'category': category, 'spent': spent, 'limit': limit, 'percentage': percentage}).decode()
                 )
                 alerts.append(alert)
                 
                 # Send email if enabled
                 if Config.ENABLE_EMAIL_NOTIFICATIONS:
-                    self._send_budget_alert_email(user_id, category, spent, limit, percentage, 'warning')
+                    emails.append((category, spent, limit, percentage, 'warning'))
+        
+        if emails:
+            self._send_budget_alert_emails(user_id, emails, smtp)
         
         return alerts
     
+    def run_all_budget_alerts(self, user_ids: List[str]) -> Dict[str, List[Dict]]:
+        """check_budget_alerts for many users at once; user id -> alerts
+        
+        Alert emails for the whole run go out over one SMTP session.
+        """
+        with self.smtp_session() if Config.ENABLE_EMAIL_NOTIFICATIONS else nullcontext() as smtp:
+            return self._check_users(lambda user_id: self.check_budget_alerts(user_id, smtp), user_ids)
+    
+    def run_all_recurring_reminders(self, user_ids: List[str]) -> Dict[str, List[Dict]]:
+        """check_recurring_reminders for many users at once; user id -> reminders"""
+        return self._check_users(self.check_recurring_reminders, user_ids)
+    
+    def run_daily_checks(self):
+        """Budget alerts and recurring reminders for every active user"""
+        user_ids = [u['id'] for u in read_public_users() if u.get('active') == 'true']
+        self.run_all_budget_alerts(user_ids)
+        self.run_all_recurring_reminders(user_ids)
+    
+    def _check_users(self, check, user_ids: List[str]) -> Dict[str, List[Dict]]:
+        """Run a per-user check for each user on a thread pool
+        
+        One user's email or write doesn't hold up the rest. A user whose
+        check fails is logged and left out of the results.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=CHECK_WORKERS) as pool:
+            futures = {pool.submit(check, user_id): user_id for user_id in user_ids}
+            for future in as_completed(futures):
+                user_id = futures[future]
+                try:
+                    results[user_id] = future.result()
+                except Exception as e:
+                    print(f"Notification check failed for user_id {user_id}: {e}")
+        return results
+    
     def check_recurring_reminders(self, user_id: str) -> List[Dict]:
         """Check for upcoming recurring transactions and create reminders"""
         reminders = []
-        recurring_items = self.recurring_model.get_active()
-        
-        # Filter for this user's items
-        person_items = [item for item in recurring_items if item.get('user_id') == user_id]
-        
         today = datetime.now().date()
+        # Only items due today or in 3 days get a reminder; ISO dates match
+        # as strings, so nothing else needs parsing
+        days_until_due = {today.isoformat(): 0, (today + timedelta(days=3)).isoformat(): 3}
         
-        for item in person_items:
-            next_date = datetime.strptime(item['next_date'], '%Y-%m-%d').date()
-            days_until = (next_date - today).days
+        for item in self.recurring_model.get_active(user_id):
+            days_until = days_until_due.get(item['next_date'])
             
             # Reminder 3 days before
             if days_until == 3:
@@ -127,7 +219,7 @@ class NotificationService:
                     type='recurring_reminder',
                     title=f'📅 Upcoming: {item["item_name"]}',
                     message=f'{item["item_name"]} ({item["frequency"]}) is due in 3 days on {item["next_date"]} - ${item["price"]}',
-                    data=f'{{"recurring_id": "{item["id"]}", "next_date": "{item["next_date"]}", "amount": {item["price"]}}}'
+                    data=self._recurring_data(item)
                 )
                 reminders.append(reminder)
             
@@ -138,25 +230,34 @@ class NotificationService:
                     type='recurring_due',
                     title=f'💰 Due Today: {item["item_name"]}',
                     message=f'{item["item_name"]} is due today - ${item["price"]}',
-                    data=f'{{"recurring_id": "{item["id"]}", "next_date": "{item["next_date"]}", "amount": {item["price"]}}}'
+                    data=self._recurring_data(item)
                 )
                 reminders.append(reminder)
         
         return reminders
     
+    @staticmethod
+    def _recurring_data(item: Dict) -> str:
+        """Notification payload for a recurring item; amount is None if its price doesn't parse"""
+        try:
+            amount = float(item['price'])
+        except (TypeError, ValueError):
+            amount = None
+        return orjson.dumps({'recurring_id': item['id'], 'next_date': item['next_date'], 'amount': amount}).decode()
+    
     def check_large_transaction_alert(self, user_id: str, amount: float, 
                                      item_name: str) -> Dict:
         """Create alert for large transactions"""
         # Calculate average transaction amount
-        transactions = self.transaction_model.filter({
+        prices = self.transaction_model.prices({
             'user_id': user_id,
             'type': 'expense'
         })
         
-        if len(transactions) < 5:
+        if len(prices) < 5:
             return None
         
-        avg_amount = sum(float(t['price']) for t in transactions) / len(transactions)
+        avg_amount = sum(prices.tolist()) / len(prices)
         
         # Alert if transaction is 3x average
         if amount > avg_amount * 3:
@@ -165,7 +266,7 @@ class NotificationService:
                 type='large_transaction',
                 title='💸 Large Transaction Detected',
                 message=f'You just spent ${amount:.2f} on {item_name} (3x your average transaction)',
-                data=f'{{"amount": {amount}, "average": {avg_amount}, "item": "{item_name}"}}'
+                data=orjson.dumps({'amount': amount, 'average': avg_amount, 'item': item_name}).decode()
             )
         
         return None
@@ -184,13 +285,40 @@ class NotificationService:
             type='achievement',
             title=titles.get(goal_type, '🎉 Achievement!'),
             message=details,
-            data=f'{{"goal_type": "{goal_type}"}}'
+            data=orjson.dumps({'goal_type': goal_type}).decode()
         )
     
-    def _send_budget_alert_email(self, user_id: str, category: str, 
-                                spent: float, limit: float, 
-                                percentage: float, severity: str):
-        """Send budget alert email"""
+    @contextmanager
+    def smtp_session(self):
+        """A logged-in SMTP connection for a batch of emails, or None if SMTP is not configured"""
+        if not Config.SMTP_USERNAME or not Config.SMTP_PASSWORD:
+            yield None
+            return
+        
+        with smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT) as server:
+            server.starttls()
+            server.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
+            yield server
+    
+    def _send_message(self, smtp: smtplib.SMTP, msg):
+        """Send over a session, logging in again if the server dropped it"""
+        try:
+            smtp.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            smtp.connect(Config.SMTP_SERVER, Config.SMTP_PORT)
+            smtp.ehlo()
+            smtp.starttls()
+            smtp.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
+            smtp.send_message(msg)
+    
+    def _send_budget_alert_emails(self, user_id: str, alerts: List[tuple], 
+                                  smtp: smtplib.SMTP = None):
+        """Email budget alerts, each (category, spent, limit, percentage, severity)
+        
+        Sent over smtp if given (one message at a time, as the batch's other
+        threads share it), otherwise over a session opened for this check's
+        alerts alone.
+        """
         user = get_user_by_id(user_id)
         if not user or not user.get('email'):
             return
@@ -202,67 +330,30 @@ class NotificationService:
             return
         
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f'Budget Alert: {category}'
-            msg['From'] = Config.SMTP_FROM
-            msg['To'] = email
-            
-            # Text version
-            text = f"""
-Budget Alert: {category}
-
-You've used {percentage:.0f}% of your {category} budget.
-Spent: ${spent:.2f}
-Limit: ${limit:.2f}
-Remaining: ${limit - spent:.2f}
-
-{'⚠️ Warning: Approaching budget limit' if severity == 'warning' else '🚨 Critical: Over or near budget limit'}
-
-- Receipt Tracker
-            """
-            
-            # HTML version
-            color = '#ffc107' if severity == 'warning' else '#dc3545'
-            html = f"""
-<html>
-  <body style="font-family: Arial, sans-serif;">
-    <div style="background: {color}; color: white; padding: 20px; text-align: center;">
-      <h2>{'⚠️' if severity == 'warning' else '🚨'} Budget Alert</h2>
-    </div>
-    <div style="padding: 20px;">
-      <h3>{category} Budget</h3>
-      <div style="background: #f8f9fa; padding: 15px; border-radius: 8px;">
-        <p><strong>Usage:</strong> {percentage:.0f}%</p>
-        <div style="background: #dee2e6; height: 20px; border-radius: 10px;">
-          <div style="background: {color}; width: {min(percentage, 100)}%; height: 20px; border-radius: 10px;"></div>
-        </div>
-        <p><strong>Spent:</strong> ${spent:.2f}</p>
-        <p><strong>Limit:</strong> ${limit:.2f}</p>
-        <p><strong>Remaining:</strong> ${limit - spent:.2f}</p>
-      </div>
-      <p style="margin-top: 20px;">
-        {'You\'re approaching your budget limit. Consider reducing spending in this category.' if severity == 'warning' 
-         else 'You\'ve reached or exceeded your budget limit. Please review your spending.'}
-      </p>
-    </div>
-    <div style="background: #f8f9fa; padding: 10px; text-align: center; color: #666;">
-      <small>Receipt Tracker Budget Alert System</small>
-    </div>
-  </body>
-</html>
-            """
-            
-            part1 = MIMEText(text, 'plain')
-            part2 = MIMEText(html, 'html')
-            msg.attach(part1)
-            msg.attach(part2)
-            
-            with smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT) as server:
-                server.starttls()
-                server.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
-                server.send_message(msg)
+            messages = []
+            for category, spent, limit, percentage, severity in alerts:
+                msg = MIMEMultipart('alternative')
+                msg['Subject'] = f'Budget Alert: {category}'
+                msg['From'] = Config.SMTP_FROM
+                msg['To'] = email
+                
+                context = {
+                    'category': category,
+                    'spent': spent,
+                    'limit': limit,
+                    'percentage': percentage,
+                    'warning': severity == 'warning',
+                    'color': '#ffc107' if severity == 'warning' else '#dc3545'
+                }
+                msg.attach(MIMEText(_BUDGET_ALERT_TEXT.render(context), 'plain'))
+                msg.attach(MIMEText(_BUDGET_ALERT_HTML.render(context), 'html'))
+                messages.append(msg)
             
-            print(f"Budget alert email sent to {user['full_name']}")
+            with nullcontext(smtp) if smtp else self.smtp_session() as session, \
+                 self._smtp_lock if smtp else nullcontext():
+                for msg in messages:
+                    self._send_message(session, msg)
+                    print(f"Budget alert email sent to {user['full_name']}")
         
         except Exception as e:
             print(f"Error sending budget alert email: {e}")
@@ -273,27 +364,28 @@ Remaining: ${limit - spent:.2f}
         if not user or not user.get('email'):
             return
         
-        # Get today's transactions
+        # Today's prices, read from the parsed columns without copying rows
         today = datetime.now().strftime('%Y-%m-%d')
-        transactions = self.transaction_model.filter({
+        filters = {
             'user_id': user_id,
             'start_date': today,
             'end_date': today
-        })
+        }
+        count = len(self.transaction_model.prices(filters))
         
-        if not transactions:
+        if not count:
             return
         
-        total_spent = sum(float(t['price']) for t in transactions if t['type'] == 'expense')
-        total_income = sum(float(t['price']) for t in transactions if t['type'] == 'income')
+        total_spent = sum(self.transaction_model.prices({**filters, 'type': 'expense'}).tolist())
+        total_income = sum(self.transaction_model.prices({**filters, 'type': 'income'}).tolist())
         
         # Create notification
         self.create_notification(
             user=user_id,
             type='daily_summary',
             title=f'📊 Daily Summary: {today}',
-            message=f'Today: {len(transactions)} transactions, ${total_spent:.2f} spent, ${total_income:.2f} income',
-            data=f'{{"transactions": {len(transactions)}, "spent": {total_spent}, "income": {total_income}}}'
+            message=f'Today: {count} transactions, ${total_spent:.2f} spent, ${total_income:.2f} income',
+            data=orjson.dumps({'transactions': count, 'spent': total_spent, 'income': total_income}).decode()
         )
 
 
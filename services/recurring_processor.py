@@ -3,8 +3,22 @@ Recurring Transaction Processor
 Handles automatic generation of recurring transactions
 """
 
-from datetime import datetime, timedelta
+import os
+import time
+import threading
+from calendar import monthrange
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from config import Config
 from models import RecurringModel, TransactionModel
+from services.notification_service import notification_service
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+_FREQUENCIES = frozenset(('daily', 'weekly', 'biweekly', 'monthly', 'yearly'))
 
 def process_recurring_transactions():
     """Process all active recurring transactions and generate new transactions"""
@@ -12,20 +26,38 @@ def process_recurring_transactions():
     transaction_model = TransactionModel()
     
     recurring_items = recurring_model.get_active()
-    today = datetime.now().date()
-    updated = False
+    today = date.today()
+    today_str = today.isoformat()
+    # Generated occurrences and advanced dates, written once at the end
+    new_transactions = []
+    next_dates = {}
     
     for item in recurring_items:
-        next_date = datetime.strptime(item['next_date'], '%Y-%m-%d').date()
+        # ISO dates compare chronologically as strings, so skip parsing
+        # anything that is not yet due
+        next_str = item.get('next_date') or ''
+        if next_str > today_str:
+            continue
+        
+        # Skip rows that cannot be advanced rather than failing the batch;
+        # an unknown frequency would never move next_date forward
+        if item['frequency'] not in _FREQUENCIES:
+            print(f"Skipping recurring item {item['id']}: unknown frequency {item['frequency']!r}")
+            continue
+        try:
+            next_date = date.fromisoformat(next_str)
+        except ValueError:
+            print(f"Skipping recurring item {item['id']}: invalid next_date {next_str!r}")
+            continue
         
         # Process all overdue recurring transactions
         while next_date <= today:
             # Create transaction
-            transaction_model.create({
+            new_transactions.append({
                 'item_name': item['item_name'],
                 'category': item['category'],
                 'store': item['store'],
-                'date': next_date.strftime('%Y-%m-%d'),
+                'date': next_date.isoformat(),
                 'price': item['price'],
                 'user_id': item.get('user_id'),
                 'bank_account_id': item.get('bank_account_id'),
@@ -53,16 +85,93 @@ def process_recurring_transactions():
                     month += 1
                 
                 # Handle day overflow (e.g., Jan 31 -> Feb 28)
-                day = min(next_date.day, [31, 29 if year % 4 == 0 else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31][month - 1])
+                day = min(next_date.day, monthrange(year, month)[1])
                 next_date = next_date.replace(year=year, month=month, day=day)
             
             elif item['frequency'] == 'yearly':
-                next_date = next_date.replace(year=next_date.year + 1)
+                # Feb 29 falls back to Feb 28 outside leap years
+                year = next_date.year + 1
+                day = min(next_date.day, monthrange(year, next_date.month)[1])
+                next_date = next_date.replace(year=year, day=day)
             
-            # Update next date
-            recurring_model.update_by_id(int(item['id']), {
-                'next_date': next_date.strftime('%Y-%m-%d')
-            })
-            updated = True
+            next_dates[item['id']] = next_date.isoformat()
+    
+    transaction_model.create_many(new_transactions)
+    # Update next dates
+    recurring_model.update_many({item_id: {'next_date': next_date}
+                                 for item_id, next_date in next_dates.items()})
+    
+    return bool(next_dates)
+
+_run_lock = threading.Lock()
+_scheduler = None
+
+@contextmanager
+def _exclusive():
+    """Hold the lock file next to the CSVs, shared with every worker process"""
+    lock_path = os.path.join(os.path.dirname(Config.CSV_FILES['recurring']), '.recurring.lock')
+    with _run_lock, open(lock_path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def run_recurring_transactions():
+    """Process recurring transactions, one run at a time across workers"""
+    with _exclusive():
+        return process_recurring_transactions()
+
+def run_daily_checks() -> bool:
+    """Run the notification checks for all users once a day, from RECURRING_CHECK_HOUR
+    
+    The day of the last run is kept in a file, so of several workers only
+    the first to get there runs them.
+    """
+    now = datetime.now()
+    if now.hour < Config.RECURRING_CHECK_HOUR:
+        return False
+    
+    today = now.date().isoformat()
+    marker = os.path.join(os.path.dirname(Config.CSV_FILES['recurring']), '.daily_checks')
+    with _exclusive():
+        try:
+            with open(marker) as f:
+                if f.read().strip() == today:
+                    return False
+        except OSError:
+            pass
+        # Marked before running, so a failing run is not repeated every interval
+        with open(marker, 'w') as f:
+            f.write(today)
+    
+    notification_service.run_daily_checks()
+    return True
+
+def start_recurring_scheduler():
+    """Catch up on due items now, then keep processing on a background thread
+    
+    Each later run also starts the day's notification checks once they are due.
+    """
+    global _scheduler
+    try:
+        run_recurring_transactions()
+    except Exception as e:
+        print(f"Recurring processing failed: {e}")
+    
+    interval = Config.RECURRING_INTERVAL_MINUTES * 60
+    if _scheduler is not None or interval <= 0:
+        return
+    
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                run_recurring_transactions()
+            except Exception as e:
+                print(f"Recurring processing failed: {e}")
+            try:
+                run_daily_checks()
+            except Exception as e:
+                print(f"Daily notification checks failed: {e}")
     
-    return updated
\ No newline at end of file
+    _scheduler = threading.Thread(target=loop, name='recurring-processor', daemon=True)
+    _scheduler.start()
@@ -13,7 +13,6 @@ echo "Creating directory structure..."
 mkdir -p services
 mkdir -p routes
 mkdir -p utils
-mkdir -p uploads
 mkdir -p receipts
 mkdir -p templates
 mkdir -p static
@@ -107,7 +106,6 @@ if [ ! -f ".gitignore" ]; then
     cat > .gitignore << 'EOF'
 venv/
 .env
-uploads/*
 receipts/*
 __pycache__/
 *.pyc
@@ -121,7 +119,6 @@ EOF
 fi
 
 # Create gitkeep files to preserve directories
-touch uploads/.gitkeep
 touch receipts/.gitkeep
 
 echo ""
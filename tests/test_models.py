@@ -0,0 +1,68 @@
+"""
+Model tests
+Run with pytest, or python -m unittest discover tests
+"""
+
+import atexit
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models
+from config import Config
+from models import SplitModel, SQLiteModel, TransactionModel
+
+# Nothing here buffers CSV writes; don't create tables in the working directory at exit
+atexit.unregister(models.flush_all)
+
+# The models as USE_SQLITE builds them, whatever this process was started with
+class SQLiteTransactionModel(TransactionModel, SQLiteModel):
+    pass
+
+class SQLiteSplitModel(SplitModel, SQLiteModel):
+    pass
+
+class SQLiteCreateManyTest(unittest.TestCase):
+    """create_many with USE_SQLITE: rows of one batch get distinct ids"""
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        csv_files = {table: os.path.join(tmp.name, os.path.basename(path))
+                     for table, path in Config.CSV_FILES.items()}
+        for patcher in (
+            mock.patch.object(Config, 'SQLITE_PATH', os.path.join(tmp.name, 'data.db')),
+            mock.patch.object(Config, 'CSV_FILES', csv_files),
+            mock.patch.object(SQLiteModel, '_initialized', set()),
+            mock.patch.object(models, '_sqlite_local', threading.local()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def test_transaction_ids_are_distinct(self):
+        model = SQLiteTransactionModel()
+        model.create({'item_name': 'milk', 'price': 3})
+        created = model.create_many([{'item_name': 'bread', 'price': 2}] * 3)
+        
+        ids = [t['id'] for t in created]
+        self.assertEqual(ids, ['2', '3', '4'])
+        self.assertEqual(sorted(t['id'] for t in model.read_all()), ['1', '2', '3', '4'])
+        
+        # Deleting one item of the batch leaves the others
+        model.delete_by_id(3)
+        self.assertEqual(sorted(t['id'] for t in model.read_all()), ['1', '2', '4'])
+    
+    def test_split_ids_are_distinct(self):
+        model = SQLiteSplitModel()
+        created = model.create_many([{'receipt_group_id': 'rg1', 'user_id': '1', 'amount': 5}] * 2)
+        created += model.create_many([{'receipt_group_id': 'rg2', 'user_id': '2', 'amount': 5}] * 2)
+        
+        self.assertEqual([s['id'] for s in created], ['1', '2', '3', '4'])
+
+if __name__ == '__main__':
+    unittest.main()
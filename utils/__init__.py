@@ -4,31 +4,40 @@ Utilities package initialization
 
 from .helpers import (
     allowed_file,
+    is_iso_date,
     save_receipt_image,
     format_currency,
     get_person_groups,
     filter_by_person_access,
     calculate_splits,
     get_current_month,
+    get_recent_months,
     get_date_range,
     generate_unique_id
 )
 
 from .decorators import (
     api_response,
+    conditional_etag,
     requires_person_access
 )
 
+from .json_provider import OrjsonProvider
+
 __all__ = [
     'allowed_file',
+    'is_iso_date',
     'save_receipt_image',
     'format_currency',
     'get_person_groups',
     'filter_by_person_access',
     'calculate_splits',
     'get_current_month',
+    'get_recent_months',
     'get_date_range',
     'generate_unique_id',
     'api_response',
-    'requires_person_access'
+    'conditional_etag',
+    'requires_person_access',
+    'OrjsonProvider'
 ]
\ No newline at end of file
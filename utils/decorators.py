@@ -2,8 +2,10 @@
 Custom decorators for Receipt Tracker
 """
 
+import hashlib
 from functools import wraps
-from flask import jsonify
+from flask import jsonify, make_response, request, session
+from auth import get_current_user
 
 def api_response(f):
     """Decorator to standardize API responses"""
@@ -18,13 +20,36 @@ def api_response(f):
             return jsonify({'error': str(e)}), 500
     return decorated_function
 
+def conditional_etag(*versions):
+    """Answer 304 Not Modified while the data behind a GET is unchanged
+    
+    Each entry in versions is a zero-argument callable returning a cheap
+    stamp of one table the view reads (e.g. a model's version()). The ETag
+    also covers the session user, since every listing is per-user.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            stamp = (session.get('user_id'), request.full_path, [v() for v in versions])
+            etag = hashlib.blake2b(repr(stamp).encode(), digest_size=16).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+            
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            return response
+        return decorated_function
+    return decorator
+
 def requires_person_access(f):
     """Decorator to ensure person has access to resource"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        from flask import request
-        from auth import get_current_user
-        
         user = get_current_user()
         if not user:
             return jsonify({'error': 'Unauthorized'}), 401
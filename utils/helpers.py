@@ -4,20 +4,38 @@ Common functions used across the application
 """
 
 import os
-import uuid
-from werkzeug.utils import secure_filename
+import re
+from calendar import monthrange
+from datetime import date, datetime
 from config import Config
+from models import GroupModel
+
+# Shared like the service singletons; the member index it reads is cached
+# per table version, so one instance stays current
+_group_model = GroupModel()
+
+ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}', re.ASCII)
+
+def is_iso_date(value) -> bool:
+    """Check a date is a real calendar day in stored-format YYYY-MM-DD"""
+    if not isinstance(value, str) or ISO_DATE.fullmatch(value) is None:
+        return False
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
 
 def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
+    _, dot, ext = filename.rpartition('.')
+    return bool(dot) and ext.lower() in Config.ALLOWED_EXTENSIONS
 
 def save_receipt_image(file) -> str:
     """Save uploaded receipt image and return filename"""
     if file and allowed_file(file.filename):
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"{uuid.uuid4().hex}.{ext}"
+        ext = file.filename.rpartition('.')[2].lower()
+        filename = f"{os.urandom(16).hex()}.{ext}"
         filepath = os.path.join(Config.RECEIPT_FOLDER, filename)
         file.save(filepath)
         return filename
@@ -29,67 +47,76 @@ def format_currency(amount: float) -> str:
 
 def get_person_groups(person_id: str):
     """Get all groups a person belongs to"""
-    from models import GroupModel
-    group_model = GroupModel()
-    return group_model.get_by_member(person_id)
+    # Served from GroupModel's member -> groups index, rebuilt only when the
+    # groups table changes; the dicts are fresh copies callers may reshape
+    return _group_model.get_by_member(person_id)
 
 def filter_by_person_access(items: list, person_id: str) -> list:
     """Filter items to only show what the current person should see"""
-    from models import GroupModel
-
     if not person_id:
         return []
     
-    group_model = GroupModel()
-    person_groups = group_model.get_by_member(person_id)
-    group_ids = [g['id'] for g in person_groups]
-
-    filtered = []
-    for item in items:
-        # Show if person owns it or is in the group
-        if item.get('user_id') == person_id or \
-           item.get('group_id') in group_ids or \
-           not item.get('group_id'):
-            filtered.append(item)
-    
-    return filtered
+    # Group ids the person may see, plus the blanks marking non-group items,
+    # so each item costs one owner check and one set lookup
+    visible = _group_model.get_group_ids(person_id) | {'', None}
+
+    # Show if person owns it, is in the group, or it isn't a group item
+    return [item for item in items
+            if item.get('user_id') == person_id or item.get('group_id') in visible]
 
 def calculate_splits(total_amount: float, members: list) -> list:
-    """Calculate equal splits for group members"""
+    """Calculate equal splits for group members
+    
+    Shares are whole cents that add up to the total; when it doesn't divide
+    evenly, the first members pay one cent more.
+    """
     if not members:
         return []
     
-    percentage = 100.0 / len(members)
-    amount_per_person = total_amount / len(members)
+    percentage = round(100.0 / len(members), 2)
+    share, remainder = divmod(round(total_amount * 100), len(members))
     
-    splits = []
-    for member in members:
-        splits.append({
-            'user_id': member,
-            'amount': round(amount_per_person, 2),
-            'percentage': round(percentage, 2)
-        })
-    
-    return splits
+    return [{
+        'user_id': member,
+        'amount': (share + (i < remainder)) / 100,
+        'percentage': percentage
+    } for i, member in enumerate(members)]
 
 def get_current_month() -> str:
     """Get current month in YYYY-MM format"""
-    from datetime import datetime
     return datetime.now().strftime('%Y-%m')
 
+def get_recent_months(count: int, today) -> list:
+    """The last `count` calendar months up to today's, as YYYY-MM, oldest first"""
+    year, month = today.year, today.month
+    months = []
+    for _ in range(count):
+        months.append(f'{year:04d}-{month:02d}')
+        month -= 1
+        if month == 0:
+            month = 12
+            year -= 1
+    months.reverse()
+    return months
+
 def get_date_range(months_back: int = 6) -> tuple:
-    """Get date range for N months back"""
-    from datetime import datetime, timedelta
+    """Get date range for N calendar months back, ending today
     
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30 * months_back)
+    The start keeps today's day of the month, clamped to the month's
+    length (e.g. May 31 six months back is Nov 30).
+    """
+    end_date = date.today()
+    year, month = divmod(end_date.year * 12 + end_date.month - 1 - months_back, 12)
+    month += 1
+    start_date = end_date.replace(year=year, month=month,
+                                  day=min(end_date.day, monthrange(year, month)[1]))
     
-    return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    return start_date.isoformat(), end_date.isoformat()
 
 def parse_csv_safe(value: str, default=''):
     """Safely parse CSV value"""
     return value.strip() if value else default
 
 def generate_unique_id() -> str:
-    """Generate unique identifier"""
-    return str(uuid.uuid4())
\ No newline at end of file
+    """Generate unique identifier (128 random bits as hex)"""
+    return os.urandom(16).hex()
\ No newline at end of file
@@ -0,0 +1,31 @@
+"""
+orjson-backed JSON provider for Flask
+Drop-in replacement for the stdlib encoder behind jsonify/request.json
+"""
+
+import orjson
+from flask.json.provider import DefaultJSONProvider, _default
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Serialize responses with orjson, keeping Flask's defaults for other types"""
+
+    def _options(self, sort_keys: bool) -> int:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs) -> str:
+        """Serialize to a JSON string"""
+        option = self._options(kwargs.get('sort_keys', self.sort_keys))
+        return orjson.dumps(obj, default=_default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        """Deserialize from a JSON string or bytes"""
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Build a JSON response without the intermediate str round-trip"""
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self._options(self.sort_keys))
+        return self._app.response_class(body, mimetype=self.mimetype)